@@ -1,11 +1,33 @@
 import argparse
+import csv
+import io
+import ipaddress
+import json
 import logging
+import mmap
+import os
+import queue
+import re
+import shutil
+import socket
+import sqlite3
+import struct
 import sys
+import tempfile
+import threading
 import time
+from collections import OrderedDict, deque, namedtuple
+from contextlib import closing
 from datetime import datetime
-from scapy.all import sniff, rdpcap, wrpcap, IP, TCP, UDP, DNS, HTTP
+from multiprocessing import Pool
+from scapy.all import conf, sniff, PcapReader, PcapWriter, IP, IPv6, TCP, UDP, DNS, DNSQR, HTTP
 from scapy.error import Scapy_Exception
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -16,8 +38,791 @@ logging.basicConfig(
     ]
 )
 
+# Classic PCAP magic numbers: (struct byte order, nanosecond timestamps)
+PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': ('<', False),
+    b'\xa1\xb2\xc3\xd4': ('>', False),
+    b'\x4d\x3c\xb2\xa1': ('<', True),
+    b'\xa1\xb2\x3c\x4d': ('>', True),
+}
+PCAP_GLOBAL_HEADER_LEN = 24
+PCAP_RECORD_HEADER_LEN = 16
+LINKTYPE_ETHERNET = 1
+ETH_VLAN_TYPES = (0x8100, 0x88A8)
+# IPv4 payloads that Scapy dissects into further IP layers (IP-in-IP, IPv6-in-IPv4, GRE)
+IP_TUNNEL_PROTOS = (4, 41, 47)
+# UDP ports that Scapy dissects into further IP layers (Mobile IP, L2TP, GRE-in-UDP, VXLAN)
+UDP_TUNNEL_PORTS = (434, 1701, 4754, 4789, 4790, 6633, 8472, 48879)
+# IPv6 hop-by-hop, routing, fragment and destination options headers
+IPV6_EXT_HEADERS = (0, 43, 44, 60)
+
+RESULT_FIELDS = ['timestamp', 'protocol', 'src', 'dst', 'summary']
+RESULT_EXTENSIONS = {'text': 'txt', 'jsonl': 'jsonl', 'csv': 'csv'}
+
+PcapHeader = namedtuple('PcapHeader', 'raw endian nano linktype')
+PacketRecord = namedtuple('PacketRecord', 'version src dst proto sport dport tcp_flags qname length')
+
+_U16 = struct.Struct('!H')
+_PORTS = struct.Struct('!HH')
+_IPV4_LEN_FRAG = struct.Struct('!H2xH')
+
+
+def read_pcap_header(pcap_file):
+    """Read the classic PCAP global header, or return None for pcapng and other formats."""
+    with open(pcap_file, 'rb') as f:
+        raw = f.read(PCAP_GLOBAL_HEADER_LEN)
+    if len(raw) < PCAP_GLOBAL_HEADER_LEN or raw[:4] not in PCAP_MAGIC:
+        return None
+    endian, nano = PCAP_MAGIC[raw[:4]]
+    linktype = struct.unpack_from(endian + 'I', raw, 20)[0] & 0x0FFFFFFF
+    return PcapHeader(raw, endian, nano, linktype)
+
+
+def iter_pcap_records(f, pcap_header, end=None):
+    """Yield (offset, timestamp, wire length, record header, record bytes) from a classic PCAP, starting at a record boundary."""
+    record_struct = struct.Struct(pcap_header.endian + 'IIII')
+    divisor = 1e9 if pcap_header.nano else 1e6
+    offset = f.tell()
+    while end is None or offset < end:
+        header = f.read(PCAP_RECORD_HEADER_LEN)
+        if len(header) < PCAP_RECORD_HEADER_LEN:
+            break
+        sec, frac, caplen, wirelen = record_struct.unpack(header)
+        data = f.read(caplen)
+        if len(data) < caplen:
+            logging.warning("Truncated final record in PCAP file")
+            break
+        yield offset, sec + frac / divisor, wirelen, header, data
+        offset += PCAP_RECORD_HEADER_LEN + caplen
+
+
+def peek_headers(data):
+    """Pull the fields the pre-dissection filter needs out of an Ethernet record.
+
+    Returns (ethertype, IP protocol, packed src, packed dst, sport, dport) with None for
+    anything absent, or None when the record is too short or tunnelled and has to be left to
+    full analysis.
+    """
+    size = len(data)
+    if size < 14:
+        return None
+    eth_type = _U16.unpack_from(data, 12)[0]
+    offset = 14
+    while eth_type in ETH_VLAN_TYPES:
+        if size < offset + 4:
+            return None
+        eth_type = _U16.unpack_from(data, offset + 2)[0]
+        offset += 4
+    if eth_type == 0x0800:
+        if size < offset + 20:
+            return None
+        proto = data[offset + 9]
+        src, dst = data[offset + 12:offset + 16], data[offset + 16:offset + 20]
+        # As in BPF, only the first fragment carries ports
+        l4 = None if _U16.unpack_from(data, offset + 6)[0] & 0x1FFF else offset + (data[offset] & 0x0F) * 4
+    elif eth_type == 0x86DD:
+        if size < offset + 40:
+            return None
+        proto, l4 = data[offset + 6], offset + 40
+        src, dst = data[offset + 8:offset + 24], data[offset + 24:offset + 40]
+        # Scapy dissects through extension headers, so the filter has to look past them too
+        while proto in IPV6_EXT_HEADERS and size >= l4 + 8:
+            proto, l4 = data[l4], l4 + (data[l4 + 1] + 1) * 8
+    else:
+        return (eth_type, None, None, None, None, None)
+    if proto in IP_TUNNEL_PROTOS:
+        return None
+    if l4 is not None and proto in (6, 17) and size >= l4 + 4:
+        sport, dport = _PORTS.unpack_from(data, l4)
+        if proto == 17 and (sport in UDP_TUNNEL_PORTS or dport in UDP_TUNNEL_PORTS):
+            return None
+        return (eth_type, proto, src, dst, sport, dport)
+    return (eth_type, proto, src, dst, None, None)
+
+
+BPF_TOKEN = re.compile(r'\(|\)|&&|\|\||!|[^\s()!]+')
+BPF_PROTOCOLS = {
+    'ip': lambda h: h[0] == 0x0800,
+    'ip6': lambda h: h[0] == 0x86DD,
+    'arp': lambda h: h[0] == 0x0806,
+    'tcp': lambda h: h[1] == 6,
+    'udp': lambda h: h[1] == 17,
+}
+
+
+def compile_bpf(expression):
+    """Compile the BPF subset used for live capture into a predicate over raw Ethernet records.
+
+    Supports ip/ip6/arp/tcp/udp, [src|dst] host ADDR, [tcp|udp] [src|dst] port N, and/or/not
+    (also &&, ||, !) and parentheses; as in libpcap, "and" and "or" bind equally, left to right.
+    VLAN tags are looked through. Raises ValueError for anything outside that subset.
+    """
+    tokens = BPF_TOKEN.findall(expression)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take():
+        nonlocal pos
+        if pos >= len(tokens):
+            raise ValueError(f"unexpected end of filter: {expression}")
+        pos += 1
+        return tokens[pos - 1]
+
+    def parse_expr():
+        node = parse_unary()
+        while peek() in ('and', '&&', 'or', '||'):
+            op, left, right = take(), node, parse_unary()
+            if op in ('and', '&&'):
+                node = lambda h, l=left, r=right: l(h) and r(h)
+            else:
+                node = lambda h, l=left, r=right: l(h) or r(h)
+        return node
+
+    def parse_unary():
+        if peek() in ('not', '!'):
+            take()
+            inner = parse_unary()
+            return lambda h: not inner(h)
+        if peek() == '(':
+            take()
+            node = parse_expr()
+            if take() != ')':
+                raise ValueError(f"unbalanced parentheses in filter: {expression}")
+            return node
+        return parse_primitive()
+
+    def parse_primitive():
+        proto = take() if peek() in BPF_PROTOCOLS else None
+        direction = take() if peek() in ('src', 'dst') else None
+        if peek() not in ('host', 'port'):
+            if proto and not direction:
+                return BPF_PROTOCOLS[proto]
+            raise ValueError(f"unsupported filter primitive near '{peek()}': {expression}")
+        kind, value = take(), take()
+        if kind == 'host':
+            if proto in ('tcp', 'udp', 'arp'):
+                raise ValueError(f"unsupported host qualifier '{proto}': {expression}")
+            packed = ipaddress.ip_address(value).packed
+            if direction == 'src':
+                test = lambda h: h[2] == packed
+            elif direction == 'dst':
+                test = lambda h: h[3] == packed
+            else:
+                test = lambda h: h[2] == packed or h[3] == packed
+            if proto:
+                proto_test = BPF_PROTOCOLS[proto]
+                return lambda h: proto_test(h) and test(h)
+            return test
+        if proto in ('ip', 'ip6', 'arp'):
+            raise ValueError(f"unsupported port qualifier '{proto}': {expression}")
+        port = int(value)
+        if direction == 'src':
+            test = lambda h: h[4] == port
+        elif direction == 'dst':
+            test = lambda h: h[5] == port
+        else:
+            test = lambda h: h[4] == port or h[5] == port
+        if proto:
+            proto_test = BPF_PROTOCOLS[proto]
+            return lambda h: proto_test(h) and test(h)
+        return test
+
+    node = parse_expr()
+    if pos != len(tokens):
+        raise ValueError(f"unexpected '{tokens[pos]}' in filter: {expression}")
+
+    def predicate(data):
+        headers = peek_headers(data)
+        # Records the headers cannot judge are left to full analysis
+        return headers is None or node(headers)
+    return predicate
+
+
+def split_pcap(pcap_file, pcap_header, shards):
+    """Split a classic PCAP into (start, end) byte ranges that begin and end on record boundaries."""
+    size = os.path.getsize(pcap_file)
+    if size <= PCAP_GLOBAL_HEADER_LEN:
+        return []
+    record_struct = struct.Struct(pcap_header.endian + 'IIII')
+    target = max((size - PCAP_GLOBAL_HEADER_LEN) // shards, 1)
+    bounds = [PCAP_GLOBAL_HEADER_LEN]
+    with open(pcap_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offset = PCAP_GLOBAL_HEADER_LEN
+        # Only the 16-byte record headers are touched; packet bytes are skipped over
+        while offset + PCAP_RECORD_HEADER_LEN <= size:
+            offset += PCAP_RECORD_HEADER_LEN + record_struct.unpack_from(mm, offset)[2]
+            if offset - bounds[-1] >= target and offset < size:
+                bounds.append(offset)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def analyze_shard(task):
+    """Analyze one byte range of a classic PCAP in a worker process, spooling output to temporary files."""
+    options, pcap_header, start, end, spool_prefix = task
+    sentry = PacketSentry(**options)
+    sentry.prefilter = sentry.compile_prefilter(pcap_header.linktype)
+    results_path, display_path, pcap_path = (f"{spool_prefix}.{ext}" for ext in ('out', 'log', 'rec'))
+    # Worker output is spooled without a CSV header and merged by the parent in shard order
+    sentry.result_writer = ResultWriter(results_path, sentry.output_format, display=not sentry.quiet,
+                                        display_path=display_path, header=False, block=True)
+    try:
+        with open(pcap_path, 'wb') as writer:
+            sentry.analyze_range(pcap_header, start, end, writer if sentry.output_pcap else None)
+    finally:
+        sentry.result_writer.close()
+    return (results_path, display_path, pcap_path,
+            sentry.packet_count, sentry.match_count, sentry.fallback_count, sentry.prefiltered_count)
+
+
+def decode_dns_question(data, offset, end):
+    """Return the first DNS question name as Scapy renders it, or None if Scapy must decide."""
+    if end < offset + 12 or _U16.unpack_from(data, offset + 4)[0] == 0:
+        return None
+    pos = offset + 12
+    labels = []
+    while pos < end:
+        length = data[pos]
+        if length == 0:
+            # The question also needs its qtype/qclass to be dissected as DNSQR
+            if pos + 5 > end:
+                return None
+            try:
+                return (b'.'.join(labels) + b'.').decode()
+            except UnicodeDecodeError:
+                return None
+        if length > 63 or pos + 1 + length > end:
+            # Compression pointers, extended labels or truncated names
+            return None
+        labels.append(data[pos + 1:pos + 1 + length])
+        pos += 1 + length
+    return None
+
+
+def decode_record(data, linktype=LINKTYPE_ETHERNET):
+    """Decode Ethernet/VLAN, IPv4/IPv6, TCP/UDP and the DNS question straight from record bytes.
+
+    Returns a PacketRecord, or None when the packet needs full Scapy dissection.
+    """
+    size = len(data)
+    if linktype != LINKTYPE_ETHERNET or size < 14:
+        return None
+    eth_type = _U16.unpack_from(data, 12)[0]
+    offset = 14
+    while eth_type in ETH_VLAN_TYPES:
+        if size < offset + 4:
+            return None
+        eth_type = _U16.unpack_from(data, offset + 2)[0]
+        offset += 4
+
+    if eth_type == 0x0800:
+        if size < offset + 20:
+            return None
+        ihl = (data[offset] & 0x0F) * 4
+        if data[offset] >> 4 != 4 or ihl < 20 or size < offset + ihl:
+            return None
+        total_len, frag = _IPV4_LEN_FRAG.unpack_from(data, offset + 2)
+        if frag & 0x3FFF or total_len < ihl:
+            # Fragments and bogus lengths are left to Scapy
+            return None
+        version, proto = 4, data[offset + 9]
+        src = socket.inet_ntoa(data[offset + 12:offset + 16])
+        dst = socket.inet_ntoa(data[offset + 16:offset + 20])
+        l4, l4_end = offset + ihl, min(size, offset + total_len)
+    elif eth_type == 0x86DD:
+        if size < offset + 40 or data[offset] >> 4 != 6:
+            return None
+        version, proto = 6, data[offset + 6]
+        if proto not in (6, 17):
+            # Extension headers and ICMPv6 are left to Scapy
+            return None
+        src = socket.inet_ntop(socket.AF_INET6, data[offset + 8:offset + 24])
+        dst = socket.inet_ntop(socket.AF_INET6, data[offset + 24:offset + 40])
+        l4, l4_end = offset + 40, min(size, offset + 40 + _U16.unpack_from(data, offset + 4)[0])
+    elif eth_type == 0x0806:
+        return PacketRecord(0, '', '', None, 0, 0, 0, None, size)
+    else:
+        return None
+
+    if proto == 6:
+        if size < l4 + 20:
+            return None
+        sport, dport = _PORTS.unpack_from(data, l4)
+        data_offset = (data[l4 + 12] >> 4) * 4
+        if data_offset < 20 or (80 in (sport, dport) and l4_end > l4 + data_offset):
+            # Port 80 payloads may carry HTTP, which only Scapy dissects
+            return None
+        return PacketRecord(version, src, dst, 6, sport, dport, data[l4 + 13], None, size)
+    if proto == 17:
+        if size < l4 + 8:
+            return None
+        sport, dport = _PORTS.unpack_from(data, l4)
+        if sport in UDP_TUNNEL_PORTS or dport in UDP_TUNNEL_PORTS:
+            # Scapy reports the inner TCP/UDP of these encapsulations
+            return None
+        qname = None
+        if 53 in (sport, dport):
+            qname = decode_dns_question(data, l4 + 8, min(l4_end, l4 + _U16.unpack_from(data, l4 + 4)[0]))
+            if qname is None:
+                return None
+        return PacketRecord(version, src, dst, 17, sport, dport, 0, qname, size)
+    if proto in IP_TUNNEL_PROTOS:
+        return None
+    return PacketRecord(version, src, dst, proto, 0, 0, 0, None, size)
+
+
+TCP_FLAG_NAMES = 'FSRPAUEC'
+FLOW_FIELDS = ['first_seen', 'last_seen', 'duration', 'protocol', 'src', 'sport', 'dst', 'dport',
+               'packets', 'bytes', 'rev_packets', 'rev_bytes', 'tcp_flags', 'end_reason']
+
+
+def record_from_packet(packet):
+    """Build a PacketRecord from a dissected Scapy packet for flow tracking."""
+    if packet.haslayer(IP):
+        version, src, dst, proto = 4, packet[IP].src, packet[IP].dst, packet[IP].proto
+    elif packet.haslayer(IPv6):
+        version, src, dst, proto = 6, packet[IPv6].src, packet[IPv6].dst, packet[IPv6].nh
+    else:
+        return None
+    if packet.haslayer(TCP):
+        return PacketRecord(version, src, dst, 6, packet[TCP].sport, packet[TCP].dport, int(packet[TCP].flags), None, len(packet))
+    if packet.haslayer(UDP):
+        return PacketRecord(version, src, dst, 17, packet[UDP].sport, packet[UDP].dport, 0, None, len(packet))
+    return PacketRecord(version, src, dst, proto, 0, 0, 0, None, len(packet))
+
+
+def parse_time(value):
+    """Parse a --start-time/--end-time value given as epoch seconds or an ISO date/time."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def format_tcp_flags(flags):
+    """Render a TCP flags bitmask as letters (e.g., SA for SYN+ACK)."""
+    return ''.join(name for bit, name in enumerate(TCP_FLAG_NAMES) if flags & (1 << bit))
+
+
+class Flow:
+    """Counters for one bidirectional flow; the forward direction is whoever sent the first packet."""
+    __slots__ = ('proto', 'src', 'sport', 'dst', 'dport', 'first_seen', 'last_seen',
+                 'packets', 'bytes', 'rev_packets', 'rev_bytes', 'tcp_flags')
+
+    def __init__(self, record, timestamp):
+        self.proto = record.proto
+        self.src, self.sport = record.src, record.sport
+        self.dst, self.dport = record.dst, record.dport
+        self.first_seen = self.last_seen = timestamp
+        self.packets = self.bytes = self.rev_packets = self.rev_bytes = 0
+        self.tcp_flags = 0
+
+
+class FlowTable:
+    """Hash table of bidirectional 5-tuple flows with idle, active and capacity eviction.
+
+    Flows are kept in least-recently-active order, so idle flows are always at the front
+    and expiring them costs O(1) per flow. Expired flows are handed to on_expire(flow, reason).
+    """
+
+    def __init__(self, on_expire, idle_timeout=15, active_timeout=1800, max_flows=100000):
+        self.on_expire = on_expire
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.max_flows = max_flows
+        self.flows = OrderedDict()
+        self.clock = 0.0
+        self.expired = 0
+
+    def update(self, record, timestamp, length):
+        """Account one packet to its flow, creating or expiring flows as needed."""
+        forward = (record.src, record.sport) <= (record.dst, record.dport)
+        if forward:
+            key = (record.proto, record.src, record.sport, record.dst, record.dport)
+        else:
+            key = (record.proto, record.dst, record.dport, record.src, record.sport)
+
+        flow = self.flows.get(key)
+        if flow and timestamp - flow.first_seen >= self.active_timeout:
+            self.expire(key, 'active')
+            flow = None
+        if flow is None:
+            flow = self.flows[key] = Flow(record, timestamp)
+        else:
+            self.flows.move_to_end(key)
+
+        if record.src == flow.src and record.sport == flow.sport:
+            flow.packets += 1
+            flow.bytes += length
+        else:
+            flow.rev_packets += 1
+            flow.rev_bytes += length
+        flow.tcp_flags |= record.tcp_flags
+        if timestamp > flow.last_seen:
+            flow.last_seen = timestamp
+
+        if timestamp > self.clock:
+            self.clock = timestamp
+        self.expire_idle()
+        while len(self.flows) > self.max_flows:
+            self.expire(next(iter(self.flows)), 'capacity')
+
+    def expire_idle(self):
+        """Expire flows that have seen no packets within the idle timeout."""
+        while self.flows:
+            key, flow = next(iter(self.flows.items()))
+            if self.clock - flow.last_seen < self.idle_timeout:
+                break
+            self.expire(key, 'idle')
+
+    def expire(self, key, reason):
+        """Remove a flow from the table and emit it."""
+        self.expired += 1
+        self.on_expire(self.flows.pop(key), reason)
+
+    def flush(self):
+        """Emit every remaining flow, e.g. at the end of a capture."""
+        while self.flows:
+            self.expire(next(iter(self.flows)), 'end')
+
+
+class PacketIndex:
+    """SQLite sidecar holding the offset, timestamp, 5-tuple and protocol of every record in a classic PCAP.
+
+    The index is built during the first full pass over a capture and lets later queries by host,
+    port, protocol or time range seek straight to the matching records.
+    """
+    VERSION = 2
+    BATCH_SIZE = 10000
+
+    def __init__(self, pcap_file):
+        self.pcap_file = pcap_file
+        self.path = f"{pcap_file}.psidx"
+        self.conn = None
+        self.pending = []
+
+    def pcap_signature(self):
+        """Size and modification time used to detect a capture that changed after indexing."""
+        stat = os.stat(self.pcap_file)
+        return str(stat.st_size), str(stat.st_mtime_ns)
+
+    def is_current(self):
+        """Check that a complete index exists for the capture as it is on disk now."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with closing(sqlite3.connect(self.path)) as conn:
+                meta = dict(conn.execute('SELECT key, value FROM meta'))
+        except sqlite3.Error:
+            return False
+        size, mtime = self.pcap_signature()
+        return meta.get('version') == str(self.VERSION) and meta.get('size') == size and meta.get('mtime') == mtime
+
+    def create(self):
+        """Start a fresh index; records are then added with add() and committed by finish()."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.conn = sqlite3.connect(self.path)
+        # The index can always be rebuilt from the capture, so trade durability for load speed
+        self.conn.execute('PRAGMA journal_mode = OFF')
+        self.conn.execute('PRAGMA synchronous = OFF')
+        self.conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.execute('''
+            CREATE TABLE packets (
+                offset INTEGER PRIMARY KEY,
+                ts REAL,
+                src TEXT,
+                dst TEXT,
+                sport INTEGER,
+                dport INTEGER,
+                proto INTEGER
+            )
+        ''')
+
+    def add(self, offset, timestamp, record):
+        """Queue one record for insertion."""
+        if record and record.version:
+            self.pending.append((offset, timestamp, record.src, record.dst, record.sport, record.dport, record.proto))
+        else:
+            self.pending.append((offset, timestamp, None, None, 0, 0, 0))
+        if len(self.pending) >= self.BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Insert queued records."""
+        self.conn.executemany('INSERT INTO packets VALUES (?, ?, ?, ?, ?, ?, ?)', self.pending)
+        self.pending = []
+
+    def finish(self):
+        """Build the column indexes and mark the index as complete for the current capture."""
+        self.flush()
+        for column in ('ts', 'src', 'dst', 'sport', 'dport'):
+            self.conn.execute(f'CREATE INDEX idx_{column} ON packets ({column})')
+        size, mtime = self.pcap_signature()
+        self.conn.executemany('INSERT INTO meta VALUES (?, ?)',
+                              [('version', str(self.VERSION)), ('size', size), ('mtime', mtime)])
+        self.conn.commit()
+        self.conn.close()
+        self.conn = None
+
+    def abort(self):
+        """Discard a partially built index."""
+        self.conn.close()
+        self.conn = None
+        self.pending = []
+        os.remove(self.path)
+
+    def query(self, filter_ip=None, filter_port=None, proto=None, start_time=None, end_time=None):
+        """Yield the offsets of records that may match the filters, in capture order.
+
+        The selection is a superset: the exact filters are still applied when records are analyzed.
+        """
+        conditions, params = [], []
+        if filter_ip:
+            conditions.append('(src = ? OR dst = ?)')
+            params += [filter_ip, filter_ip]
+        if filter_port:
+            conditions.append('(sport = ? OR dport = ?)')
+            params += [filter_port, filter_port]
+        if proto:
+            conditions.append('proto = ?')
+            params.append(proto)
+        if start_time is not None:
+            conditions.append('ts >= ?')
+            params.append(start_time)
+        if end_time is not None:
+            conditions.append('ts < ?')
+            params.append(end_time)
+        sql = 'SELECT offset FROM packets'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        with closing(sqlite3.connect(self.path)) as conn:
+            for (offset,) in conn.execute(sql + ' ORDER BY offset', params):
+                yield offset
+
+
+def format_results(results, output_format):
+    """Format a batch of analysis results for the results file."""
+    if output_format == 'jsonl':
+        return ''.join(json.dumps(result) + '\n' for result in results)
+    if output_format == 'csv':
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, fieldnames=RESULT_FIELDS, extrasaction='ignore').writerows(results)
+        return buffer.getvalue()
+    return ''.join(f"[{result['timestamp']}] {result['protocol']}\n"
+                   f"Source: {result['src']} -> Destination: {result['dst']}\n"
+                   f"Summary: {result['summary']}\n"
+                   f"{'-'*50}\n" for result in results)
+
+
+def format_display(result):
+    """Format the one-line summary shown for a result."""
+    return f"{result['timestamp']} {result['protocol']} {result['src']} -> {result['dst']} {result['summary']}"
+
+
+class ResultWriter:
+    """Background thread that batches results and display lines so analysis never waits on disk or terminal I/O.
+
+    Items are collected into batches of batch_size and handed to the writer thread as a whole; a partial
+    batch is picked up after flush_interval seconds. With block=False (live capture) a batch that does not
+    fit in the queue is dropped and counted instead of stalling the capture.
+    """
+
+    def __init__(self, path, output_format='text', display=True, display_path=None, header=True, block=False,
+                 batch_size=512, flush_interval=1.0, max_queue=65536):
+        self.path = path
+        self.output_format = output_format
+        self.display = display
+        self.block = block
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(max(max_queue // batch_size, 1))
+        self.lock = threading.Lock()
+        self.pending = []
+        self.handing_off = False
+        self.backlog = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.handle = open(path, 'w', newline='') if path else None
+        self.display_handle = open(display_path, 'w') if display and display_path else None
+        if self.handle and header and output_format == 'csv':
+            csv.writer(self.handle).writerow(RESULT_FIELDS)
+        self.thread = threading.Thread(target=self.run, name='ResultWriter', daemon=True)
+        self.thread.start()
+
+    def put(self, kind, item):
+        """Add an item to the current batch, handing the batch to the writer thread once it is full."""
+        with self.lock:
+            self.pending.append((kind, item))
+            self.backlog += 1
+            if len(self.pending) < self.batch_size:
+                return
+            batch, self.pending = self.pending, []
+            self.handing_off = True
+        self.hand_off(batch, self.block)
+
+    def hand_off(self, batch, block):
+        """Queue a full batch for the writer thread."""
+        try:
+            self.queue.put(batch, block=block)
+        except queue.Full:
+            self.dropped += len(batch)
+            with self.lock:
+                self.backlog -= len(batch)
+        finally:
+            with self.lock:
+                self.handing_off = False
+                if self.backlog > self.max_depth:
+                    self.max_depth = self.backlog
+
+    def write(self, result):
+        """Queue an analysis result for the results file and display."""
+        self.put('result', result)
+
+    def write_text(self, text):
+        """Queue preformatted results file text, such as a merged worker spool."""
+        self.put('text', text)
+
+    def write_line(self, line):
+        """Queue a display line."""
+        if self.display:
+            self.put('line', line)
+
+    def depth(self):
+        """Number of items waiting to be written."""
+        return self.backlog
+
+    def run(self):
+        """Write batches as they arrive, picking up a partial batch when none arrives in time, until close()."""
+        while True:
+            try:
+                batch = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                with self.lock:
+                    # A batch being handed off, or queued since the timeout, is older than the pending
+                    # items, so write it first; a finished hand-off is queued before handing_off clears
+                    if self.handing_off or not self.queue.empty():
+                        continue
+                    batch, self.pending = self.pending, []
+            if batch is None:
+                break
+            if batch:
+                self.write_batch(batch)
+                with self.lock:
+                    self.backlog -= len(batch)
+
+    def write_batch(self, batch):
+        """Write one batch to the results file and the display."""
+        chunks, results, lines = [], [], []
+        for kind, item in batch:
+            if kind == 'result':
+                results.append(item)
+                if self.display:
+                    lines.append(format_display(item))
+                continue
+            if results:
+                chunks.append(format_results(results, self.output_format))
+                results = []
+            if kind == 'text':
+                chunks.append(item)
+            else:
+                lines.append(item)
+        if results:
+            chunks.append(format_results(results, self.output_format))
+        try:
+            if self.handle and chunks:
+                self.handle.write(''.join(chunks))
+                self.handle.flush()
+            if self.display_handle and lines:
+                self.display_handle.write('\n'.join(lines) + '\n')
+            elif lines:
+                for line in lines:
+                    logging.info(line)
+        except Exception as e:
+            logging.error(f"Error writing results: {str(e)}")
+
+    def close(self):
+        """Write everything still queued and close the output files."""
+        with self.lock:
+            batch, self.pending = self.pending, []
+        if batch:
+            self.hand_off(batch, True)
+        self.queue.put(None)
+        self.thread.join()
+        if self.handle:
+            self.handle.close()
+        if self.display_handle:
+            self.display_handle.close()
+
+
+class RotatingPcapWriter:
+    """Write-through PCAP writer for continuous capture.
+
+    Rotates to a new numbered file once the current one reaches rotate_bytes or rotate_seconds,
+    deletes the oldest files beyond max_files, and flushes at least every flush_interval seconds
+    so a crash loses at most that much traffic.
+    """
+
+    def __init__(self, path, rotate_bytes=0, rotate_seconds=0, max_files=0, flush_interval=1.0):
+        self.base, self.ext = os.path.splitext(path)
+        self.ext = self.ext or '.pcap'
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.rotating = bool(rotate_bytes or rotate_seconds)
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self.files = deque()
+        self.sequence = 0
+        self.writer = None
+        self.open_next()
+
+    def open_next(self):
+        """Close the current file and start the next one, pruning old files."""
+        if self.writer:
+            self.writer.close()
+        self.sequence += 1
+        path = f"{self.base}_{self.sequence:05d}{self.ext}" if self.rotating else self.base + self.ext
+        self.writer = PcapWriter(path)
+        self.files.append(path)
+        self.opened = self.last_flush = time.time()
+        self.written = 0
+        if self.rotating:
+            logging.info(f"Writing packets to {path}")
+        while self.max_files and len(self.files) > self.max_files:
+            old = self.files.popleft()
+            try:
+                os.remove(old)
+                logging.info(f"Removed old capture file {old}")
+            except OSError as e:
+                logging.error(f"Error removing {old}: {str(e)}")
+
+    def write(self, packet):
+        """Write one packet, rotating and flushing as configured."""
+        now = time.time()
+        if self.rotating and self.written and (
+                (self.rotate_bytes and self.written >= self.rotate_bytes) or
+                (self.rotate_seconds and now - self.opened >= self.rotate_seconds)):
+            self.open_next()
+        self.writer.write(packet)
+        self.written += PCAP_RECORD_HEADER_LEN + len(packet)
+        if now - self.last_flush >= self.flush_interval:
+            self.writer.flush()
+            self.last_flush = now
+
+    def close(self):
+        """Flush and close the current file."""
+        self.writer.close()
+
+
 class PacketSentry:
-    def __init__(self, interface=None, pcap_file=None, filter_protocol=None, filter_ip=None, filter_port=None, output_pcap=None, count=0, quiet=False):
+    def __init__(self, interface=None, pcap_file=None, filter_protocol=None, filter_ip=None, filter_port=None, output_pcap=None, count=0, quiet=False, workers=1,
+                 flows=False, idle_timeout=15, active_timeout=1800, max_flows=100000,
+                 index=False, start_time=None, end_time=None,
+                 rotate_size=0, rotate_seconds=0, max_files=0, output_format='text'):
         self.interface = interface
         self.pcap_file = pcap_file
         self.filter_protocol = filter_protocol.lower() if filter_protocol else None
@@ -26,8 +831,26 @@ class PacketSentry:
         self.output_pcap = output_pcap
         self.count = int(count) if count else 0
         self.quiet = quiet
-        self.results = []
-        self.output_file = f"packetsentry_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        self.workers = max(int(workers), 1) if workers else 1
+        self.use_index = index
+        self.start_time = parse_time(start_time)
+        self.end_time = parse_time(end_time)
+        self.index_builder = None
+        self.prefilter = None
+        self.prefiltered_count = 0
+        self.rotate_bytes = int(float(rotate_size) * 1024 * 1024) if rotate_size else 0
+        self.rotate_seconds = float(rotate_seconds) if rotate_seconds else 0
+        self.max_files = int(max_files) if max_files else 0
+        self.pcap_writer = None
+        self.output_format = output_format
+        self.result_writer = None
+        self.packet_count = 0
+        self.match_count = 0
+        self.fallback_count = 0
+        self.output_file = f"packetsentry_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{RESULT_EXTENSIONS[output_format]}"
+        self.flow_table = FlowTable(self.emit_flow, float(idle_timeout), float(active_timeout), int(max_flows)) if flows else None
+        self.flow_file = f"packetsentry_flows_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv" if flows else None
+        self.flow_writer = None
 
     def build_filter(self):
         """Build a Scapy filter string based on user inputs."""
@@ -69,80 +892,398 @@ class PacketSentry:
                 if packet[UDP].dport == 53 or packet[UDP].sport == 53:
                     if packet.haslayer(DNS):
                         result['protocol'] = 'DNS'
-                        result['summary'] += f" {packet[DNS].qname.decode() if packet[DNS].qname else 'DNS'}"
+                        result['summary'] += f" {packet[DNSQR].qname.decode() if packet.haslayer(DNSQR) else 'DNS'}"
             else:
                 result['summary'] = f"Other protocol (len={len(packet)})"
 
             # Apply filters
-            if self.filter_protocol and self.filter_protocol.lower() not in result['protocol'].lower():
-                return None
-            if self.filter_ip and self.filter_ip not in (result['src'], result['dst']):
-                return None
-            if self.filter_port and packet.haslayer(TCP) and self.filter_port not in (packet[TCP].sport, packet[TCP].dport):
-                return None
-            if self.filter_port and packet.haslayer(UDP) and self.filter_port not in (packet[UDP].sport, packet[UDP].dport):
-                return None
-
-            return result
+            ports = []
+            if packet.haslayer(TCP):
+                ports.append((packet[TCP].sport, packet[TCP].dport))
+            if packet.haslayer(UDP):
+                ports.append((packet[UDP].sport, packet[UDP].dport))
+            return result if self.passes_filters(result, ports) else None
         except Exception as e:
             logging.error(f"Error analyzing packet: {str(e)}")
             return None
 
+    def analyze_record(self, record):
+        """Build the same result as analyze_packet from a PacketRecord decoded by the fast path."""
+        result = {'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'), 'protocol': 'unknown', 'src': '', 'dst': '', 'summary': ''}
+        if record.version == 4:
+            result['src'] = record.src
+            result['dst'] = record.dst
+
+        ports = ()
+        if record.proto == 6:
+            result['protocol'] = 'TCP'
+            result['summary'] = f"TCP {record.sport} -> {record.dport}"
+            ports = ((record.sport, record.dport),)
+        elif record.proto == 17:
+            result['protocol'] = 'UDP'
+            result['summary'] = f"UDP {record.sport} -> {record.dport}"
+            if record.qname is not None:
+                result['protocol'] = 'DNS'
+                result['summary'] += f" {record.qname}"
+            ports = ((record.sport, record.dport),)
+        else:
+            result['summary'] = f"Other protocol (len={record.length})"
+        return result if self.passes_filters(result, ports) else None
+
+    def analyze_raw(self, data, linktype, timestamp, wirelen, offset=None):
+        """Analyze raw record bytes, using Scapy only for packets the fast path cannot classify."""
+        record = decode_record(data, linktype)
+        if record:
+            if self.index_builder:
+                self.index_builder.add(offset, timestamp, record)
+            result = self.analyze_record(record)
+            if result and self.flow_table:
+                self.track_flow(record, timestamp, wirelen)
+            return result
+        self.fallback_count += 1
+        packet = conf.l2types.num2layer.get(linktype, conf.raw_layer)(data)
+        packet.time = timestamp
+        packet.wirelen = wirelen
+        if self.index_builder:
+            self.index_builder.add(offset, timestamp, record_from_packet(packet))
+        return self.analyze_scapy(packet)
+
+    def index_skipped(self, offset, timestamp, data, linktype):
+        """Index a record that is not analyzed (outside the time window or rejected by the prefilter), so the index still covers the whole capture."""
+        record = decode_record(data, linktype)
+        if record is None:
+            record = record_from_packet(conf.l2types.num2layer.get(linktype, conf.raw_layer)(data))
+        self.index_builder.add(offset, timestamp, record)
+
+    def in_time_range(self, timestamp):
+        """Apply the --start-time/--end-time window to a packet timestamp."""
+        if self.start_time is not None and timestamp < self.start_time:
+            return False
+        if self.end_time is not None and timestamp >= self.end_time:
+            return False
+        return True
+
+    def analyze_scapy(self, packet):
+        """Analyze a dissected Scapy packet, feeding the flow table when flow tracking is enabled."""
+        result = self.analyze_packet(packet)
+        if result and self.flow_table:
+            self.track_flow(record_from_packet(packet), float(packet.time), packet.wirelen or len(packet))
+        return result
+
+    def track_flow(self, record, timestamp, length):
+        """Account an IP packet to the flow table."""
+        if record and record.version:
+            self.flow_table.update(record, timestamp, length)
+
+    def emit_flow(self, flow, reason):
+        """Write and display a flow that has been expired from the flow table."""
+        row = {
+            'first_seen': datetime.fromtimestamp(flow.first_seen).isoformat(sep=' ', timespec='milliseconds'),
+            'last_seen': datetime.fromtimestamp(flow.last_seen).isoformat(sep=' ', timespec='milliseconds'),
+            'duration': f"{flow.last_seen - flow.first_seen:.3f}",
+            'protocol': {6: 'TCP', 17: 'UDP'}.get(flow.proto, str(flow.proto)),
+            'src': flow.src, 'sport': flow.sport, 'dst': flow.dst, 'dport': flow.dport,
+            'packets': flow.packets, 'bytes': flow.bytes, 'rev_packets': flow.rev_packets, 'rev_bytes': flow.rev_bytes,
+            'tcp_flags': format_tcp_flags(flow.tcp_flags), 'end_reason': reason
+        }
+        if self.flow_writer:
+            self.flow_writer.writerow(row)
+        if not self.quiet:
+            line = (f"FLOW {row['protocol']} {flow.src}:{flow.sport} <-> {flow.dst}:{flow.dport} "
+                    f"packets={flow.packets}/{flow.rev_packets} bytes={flow.bytes}/{flow.rev_bytes} "
+                    f"duration={row['duration']}s flags={row['tcp_flags'] or '-'} ({reason})")
+            self.result_writer.write_line(line)
+
+    def open_flows(self):
+        """Open the flow CSV; returns the file handle to close when the capture ends."""
+        handle = open(self.flow_file, 'w', newline='')
+        self.flow_writer = csv.DictWriter(handle, fieldnames=FLOW_FIELDS)
+        self.flow_writer.writeheader()
+        return handle
+
+    def close_flows(self, handle):
+        """Flush remaining flows and close the flow CSV."""
+        self.flow_table.flush()
+        self.flow_writer = None
+        handle.close()
+        logging.info(f"{self.flow_table.expired} flows saved to {self.flow_file}")
+
+    def passes_filters(self, result, ports):
+        """Apply the protocol, IP and port filters to an analysis result."""
+        if self.filter_protocol and self.filter_protocol.lower() not in result['protocol'].lower():
+            return False
+        if self.filter_ip and self.filter_ip not in (result['src'], result['dst']):
+            return False
+        # As with the live BPF filter, a port filter only matches TCP/UDP packets
+        if self.filter_port and (not ports or any(self.filter_port not in pair for pair in ports)):
+            return False
+        return True
+
+    def compile_prefilter(self, linktype):
+        """Compile the live-capture filter into a raw-record predicate for offline analysis."""
+        expression = self.build_filter()
+        if not expression or linktype != LINKTYPE_ETHERNET:
+            return None
+        try:
+            return compile_bpf(expression)
+        except ValueError as e:
+            logging.info(f"Filtering after dissection only: {str(e)}")
+            return None
+
     def process_packet(self, packet):
         """Process a captured packet."""
-        result = self.analyze_packet(packet)
+        self.packet_count += 1
+        return self.process_result(self.analyze_scapy(packet))
+
+    def process_result(self, result):
+        """Record and display a single analysis result."""
         if result:
-            self.results.append(result)
-            if not self.quiet:
-                logging.info(f"{result['timestamp']} {result['protocol']} {result['src']} -> {result['dst']} {result['summary']}")
-
-    def save_results(self):
-        """Save analysis results to a file."""
-        with open(self.output_file, 'w') as f:
-            for result in self.results:
-                f.write(f"[{result['timestamp']}] {result['protocol']}\n")
-                f.write(f"Source: {result['src']} -> Destination: {result['dst']}\n")
-                f.write(f"Summary: {result['summary']}\n")
-                f.write(f"{'-'*50}\n")
-        logging.info(f"Results saved to {self.output_file}")
-
-    def save_pcap(self, packets):
-        """Save captured packets to a PCAP file."""
-        if self.output_pcap and packets:
-            try:
-                wrpcap(self.output_pcap, packets)
+            self.match_count += 1
+            if self.flow_table:
+                # Flow mode reports flows as they expire instead of one line per packet
+                return result
+            self.result_writer.write(result)
+        return result
+
+    def open_results(self, live=False):
+        """Start the background result writer; live captures drop records rather than wait on a full queue."""
+        self.result_writer = ResultWriter(None if self.flow_table else self.output_file, self.output_format,
+                                          display=not self.quiet, block=not live)
+
+    def close_results(self):
+        """Drain and stop the background result writer."""
+        self.result_writer.close()
+        if self.result_writer.path:
+            logging.info(f"Results saved to {self.output_file}")
+
+    def process_live(self, packet):
+        """Process a live packet and write it through to the capture file."""
+        self.process_packet(packet)
+        if self.pcap_writer:
+            self.pcap_writer.write(packet)
+
+    def capture_live(self):
+        """Capture from the interface, streaming results and packets to disk as they arrive."""
+        scapy_filter = self.build_filter()
+        logging.info(f"Starting capture on {self.interface} (filter: {scapy_filter or 'none'})")
+        started = time.time()
+        flow_handle = self.open_flows() if self.flow_table else None
+        self.open_results(live=True)
+        try:
+            if self.output_pcap:
+                self.pcap_writer = RotatingPcapWriter(self.output_pcap, self.rotate_bytes, self.rotate_seconds, self.max_files)
+            sniff(iface=self.interface, filter=scapy_filter, prn=self.process_live, count=self.count, store=0)
+        finally:
+            if self.pcap_writer:
+                self.pcap_writer.close()
+                files = self.pcap_writer.files
+                self.pcap_writer = None
+                logging.info(f"Packets saved to {files[-1]}" + (f" ({len(files)} files kept)" if len(files) > 1 else ''))
+            if flow_handle:
+                # Expire the remaining flows before draining the writer so their lines are shown first
+                self.flow_table.flush()
+            self.close_results()
+            if flow_handle:
+                self.close_flows(flow_handle)
+            self.log_stats(started)
+            self.result_writer = None
+
+    def analyze_pcap(self):
+        """Stream packets from the PCAP file, writing results and matched packets as they are processed."""
+        logging.info(f"Reading packets from {self.pcap_file}")
+        started = time.time()
+        pcap_header = read_pcap_header(self.pcap_file)
+        if pcap_header:
+            self.prefilter = self.compile_prefilter(pcap_header.linktype)
+        if self.flow_table and self.workers > 1:
+            logging.info("Flow tracking needs every packet of a flow in one table; analyzing in a single process")
+        flow_handle = self.open_flows() if self.flow_table else None
+        self.open_results()
+        index = PacketIndex(self.pcap_file) if self.use_index and pcap_header else None
+        if self.use_index and not pcap_header:
+            logging.info("Packet indexes are only supported for classic PCAP files")
+        try:
+            if index and index.is_current():
+                self.stream_indexed(pcap_header, index)
+            elif index and not self.count:
+                # The index is built from a complete pass, so it is done in a single process
+                logging.info(f"Building packet index {index.path}")
+                self.stream_raw(pcap_header, index)
+            elif pcap_header and self.workers > 1 and not self.count and not self.flow_table:
+                self.stream_sharded(pcap_header)
+            elif pcap_header:
+                self.stream_raw(pcap_header)
+            else:
+                self.stream_scapy()
+        finally:
+            if flow_handle:
+                # Expire the remaining flows before draining the writer so their lines are shown first
+                self.flow_table.flush()
+            self.close_results()
+            if flow_handle:
+                self.close_flows(flow_handle)
+            self.log_stats(started)
+            self.result_writer = None
+
+    def stream_raw(self, pcap_header, index=None):
+        """Analyze a classic PCAP record by record with the raw-bytes fast path, optionally building its index."""
+        writer = open(self.output_pcap, 'wb') if self.output_pcap else None
+        if index:
+            index.create()
+            self.index_builder = index
+        try:
+            if writer:
+                writer.write(pcap_header.raw)
+            self.analyze_range(pcap_header, PCAP_GLOBAL_HEADER_LEN, None, writer)
+            if index:
+                index.finish()
+                logging.info(f"Packet index saved to {index.path}")
+        finally:
+            if index and index.conn:
+                index.abort()
+            self.index_builder = None
+            if writer:
+                writer.close()
+                logging.info(f"Packets saved to {self.output_pcap}")
+
+    def stream_indexed(self, pcap_header, index):
+        """Analyze only the records the sidecar index selects, reading them through mmap."""
+        proto = {'tcp': 6, 'http': 6, 'udp': 17, 'dns': 17}.get(self.filter_protocol)
+        offsets = index.query(self.filter_ip, self.filter_port, proto, self.start_time, self.end_time)
+        logging.info(f"Using packet index {index.path}")
+        record_struct = struct.Struct(pcap_header.endian + 'IIII')
+        divisor = 1e9 if pcap_header.nano else 1e6
+        writer = open(self.output_pcap, 'wb') if self.output_pcap else None
+        try:
+            if writer:
+                writer.write(pcap_header.raw)
+            with open(self.pcap_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset in offsets:
+                    sec, frac, caplen, wirelen = record_struct.unpack_from(mm, offset)
+                    data_start = offset + PCAP_RECORD_HEADER_LEN
+                    data = mm[data_start:data_start + caplen]
+                    self.packet_count += 1
+                    if self.prefilter and not self.prefilter(data):
+                        self.prefiltered_count += 1
+                        continue
+                    if self.process_result(self.analyze_raw(data, pcap_header.linktype, sec + frac / divisor, wirelen)) and writer:
+                        writer.write(mm[offset:data_start])
+                        writer.write(data)
+                    if self.count and self.packet_count >= self.count:
+                        break
+        finally:
+            # Closes the index connection when the loop stops early
+            offsets.close()
+            if writer:
+                writer.close()
+                logging.info(f"Packets saved to {self.output_pcap}")
+
+    def analyze_range(self, pcap_header, start, end, writer):
+        """Analyze the records in the byte range [start, end) of a classic PCAP."""
+        with open(self.pcap_file, 'rb') as f:
+            f.seek(start)
+            for offset, timestamp, wirelen, header, data in iter_pcap_records(f, pcap_header, end):
+                if not self.in_time_range(timestamp):
+                    if self.index_builder:
+                        self.index_skipped(offset, timestamp, data, pcap_header.linktype)
+                    continue
+                self.packet_count += 1
+                if self.prefilter and not self.prefilter(data):
+                    self.prefiltered_count += 1
+                    if self.index_builder:
+                        self.index_skipped(offset, timestamp, data, pcap_header.linktype)
+                    continue
+                if self.process_result(self.analyze_raw(data, pcap_header.linktype, timestamp, wirelen, offset)) and writer:
+                    writer.write(header)
+                    writer.write(data)
+                if self.count and self.packet_count >= self.count:
+                    break
+
+    def stream_sharded(self, pcap_header):
+        """Analyze a classic PCAP in a process pool, one record-aligned byte range per task, merging in order."""
+        # Several shards per worker keep the pool busy when packet mixes are uneven
+        shards = split_pcap(self.pcap_file, pcap_header, self.workers * 4)
+        logging.info(f"Analyzing {len(shards)} shards with {self.workers} workers")
+        options = {'pcap_file': self.pcap_file, 'filter_protocol': self.filter_protocol, 'filter_ip': self.filter_ip,
+                   'filter_port': self.filter_port, 'output_pcap': self.output_pcap, 'quiet': self.quiet,
+                   'start_time': self.start_time, 'end_time': self.end_time, 'output_format': self.output_format}
+        spool_dir = tempfile.mkdtemp(prefix='packetsentry_')
+        tasks = [(options, pcap_header, start, end, os.path.join(spool_dir, f"shard_{i:05d}"))
+                 for i, (start, end) in enumerate(shards)]
+        writer = open(self.output_pcap, 'wb') if self.output_pcap else None
+        try:
+            if writer:
+                writer.write(pcap_header.raw)
+            with Pool(self.workers) as pool:
+                # imap hands shards back in file order, so the merged output keeps the original packet order
+                for results_path, display_path, pcap_path, packets, matches, fallbacks, prefiltered in pool.imap(analyze_shard, tasks):
+                    self.packet_count += packets
+                    self.match_count += matches
+                    self.fallback_count += fallbacks
+                    self.prefiltered_count += prefiltered
+                    with open(results_path, newline='') as f:
+                        for chunk in iter(lambda: f.read(1024 * 1024), ''):
+                            self.result_writer.write_text(chunk)
+                    if os.path.exists(display_path):
+                        with open(display_path) as f:
+                            for line in f:
+                                self.result_writer.write_line(line.rstrip('\n'))
+                    if writer:
+                        with open(pcap_path, 'rb') as f:
+                            shutil.copyfileobj(f, writer)
+                    for path in (results_path, display_path, pcap_path):
+                        if os.path.exists(path):
+                            os.remove(path)
+        finally:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            if writer:
+                writer.close()
                 logging.info(f"Packets saved to {self.output_pcap}")
-            except Exception as e:
-                logging.error(f"Error saving PCAP: {str(e)}")
+
+    def stream_scapy(self):
+        """Analyze pcapng and other capture formats through Scapy's incremental reader."""
+        writer = PcapWriter(self.output_pcap) if self.output_pcap else None
+        try:
+            with PcapReader(self.pcap_file) as reader:
+                for packet in reader:
+                    if not self.in_time_range(float(packet.time)):
+                        continue
+                    if self.process_packet(packet) and writer:
+                        writer.write(packet)
+                    if self.count and self.packet_count >= self.count:
+                        break
+        finally:
+            if writer:
+                writer.close()
+                logging.info(f"Packets saved to {self.output_pcap}")
+
+    def log_stats(self, started):
+        """Log throughput and peak memory for the finished run."""
+        elapsed = max(time.time() - started, 1e-6)
+        stats = f"Processed {self.packet_count} packets ({self.match_count} matched, {self.prefiltered_count} rejected before dissection, {self.fallback_count} via Scapy) in {elapsed:.2f}s ({self.packet_count / elapsed:.0f} packets/sec)"
+        if resource:
+            # ru_maxrss is reported in kilobytes on Linux
+            stats += f", peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB"
+        if self.result_writer:
+            stats += f", result queue peak depth {self.result_writer.max_depth}, {self.result_writer.dropped} results dropped"
+        logging.info(stats)
 
     def start(self):
         """Start packet capture or analysis."""
-        packets = []
         try:
             if self.pcap_file:
-                # Read from PCAP file
-                logging.info(f"Reading packets from {self.pcap_file}")
-                packets = rdpcap(self.pcap_file)
-                for packet in packets:
-                    self.process_packet(packet)
+                # Stream from PCAP file; results and packets are written incrementally
+                self.analyze_pcap()
             else:
                 # Capture live packets
                 if not self.interface:
                     logging.error("No interface specified for live capture")
                     return
-                scapy_filter = self.build_filter()
-                logging.info(f"Starting capture on {self.interface} (filter: {scapy_filter or 'none'})")
-                sniff(iface=self.interface, filter=scapy_filter, prn=self.process_packet, count=self.count, store=1, prn_store=packets.append)
-
-            # Save results and packets
-            self.save_results()
-            self.save_pcap(packets)
+                self.capture_live()
         except Scapy_Exception as e:
             logging.error(f"Scapy error: {str(e)}")
         except KeyboardInterrupt:
             logging.info("PacketSentry stopped by user")
-            self.save_results()
-            self.save_pcap(packets)
         except Exception as e:
             logging.error(f"Error: {str(e)}")
 
@@ -156,6 +1297,18 @@ def main():
     parser.add_argument('-o', '--output-pcap', help='Output PCAP file to save captured packets')
     parser.add_argument('-c', '--count', default=0, help='Number of packets to capture (0 for unlimited, default: 0)')
     parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode (log to file only)')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Worker processes for analyzing a PCAP file (default: 1)')
+    parser.add_argument('--flows', action='store_true', help='Report bidirectional flows instead of individual packets')
+    parser.add_argument('--idle-timeout', type=float, default=15, help='Seconds without packets before a flow is expired (default: 15)')
+    parser.add_argument('--active-timeout', type=float, default=1800, help='Maximum flow duration before it is reported and restarted (default: 1800)')
+    parser.add_argument('--max-flows', type=int, default=100000, help='Maximum flows held in memory (default: 100000)')
+    parser.add_argument('--index', action='store_true', help='Build or use a <pcap>.psidx sidecar index to answer repeated queries')
+    parser.add_argument('--start-time', help='Only analyze packets at or after this time (epoch seconds or ISO date/time)')
+    parser.add_argument('--end-time', help='Only analyze packets before this time (epoch seconds or ISO date/time)')
+    parser.add_argument('--rotate-size', type=float, default=0, help='Start a new live capture file after this many MB (default: no rotation)')
+    parser.add_argument('--rotate-seconds', type=float, default=0, help='Start a new live capture file after this many seconds (default: no rotation)')
+    parser.add_argument('--max-files', type=int, default=0, help='Keep at most this many rotated capture files (0 for unlimited, default: 0)')
+    parser.add_argument('--format', choices=sorted(RESULT_EXTENSIONS), default='text', help='Results file format (default: text)')
 
     args = parser.parse_args()
 
@@ -174,7 +1327,19 @@ def main():
         filter_port=args.filter_port,
         output_pcap=args.output_pcap,
         count=args.count,
-        quiet=args.quiet
+        quiet=args.quiet,
+        workers=args.workers,
+        flows=args.flows,
+        idle_timeout=args.idle_timeout,
+        active_timeout=args.active_timeout,
+        max_flows=args.max_flows,
+        index=args.index,
+        start_time=args.start_time,
+        end_time=args.end_time,
+        rotate_size=args.rotate_size,
+        rotate_seconds=args.rotate_seconds,
+        max_files=args.max_files,
+        output_format=args.format
     )
 
     try:
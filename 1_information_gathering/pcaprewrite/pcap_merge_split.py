@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+PcapMergeSplit: A private companion to PcapRewrite for combining and dividing PCAP files.
+Merges several captures into one timestamp-ordered stream, or splits one capture by flow hash or time window.
+Both directions stream record by record, so captures of any size are handled in constant memory.
+For authorized, personal use only. Do not share or distribute.
+"""
+
+import argparse
+import heapq
+import os
+import struct
+import sys
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from scapy.all import PcapReader, conf
+from pcap_rewrite import (
+    ETH_VLAN_TYPES,
+    LINKTYPE_ETHERNET,
+    iter_records,
+    open_input,
+    open_output,
+    read_pcap_header,
+    write_pcap_header,
+)
+
+# Raw IP link types: LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6
+LINKTYPE_RAW = (101, 228, 229)
+
+
+def parse_arguments():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="PcapMergeSplit: Merge PCAP files by timestamp or split them by flow or time."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    merge = commands.add_parser("merge", help="Merge captures into one timestamp-ordered PCAP")
+    merge.add_argument("infiles", nargs="+", help="Input PCAP/pcapng files")
+    merge.add_argument(
+        "--outfile", required=True, help="Output PCAP file path, or - for stdout"
+    )
+
+    split = commands.add_parser("split", help="Split a capture by flow hash or time window")
+    split.add_argument(
+        "--infile", required=True, help="Input PCAP/pcapng file path, or - for stdin"
+    )
+    split.add_argument(
+        "--prefix", required=True, help="Output file prefix (e.g., out/part)"
+    )
+    split.add_argument(
+        "--by", choices=["flow", "time"], default="flow", help="Split by flow hash or time window (default: flow)"
+    )
+    split.add_argument(
+        "--files", type=int, default=8, help="Number of output files for --by flow (default: 8)"
+    )
+    split.add_argument(
+        "--interval", type=float, default=3600, help="Window length in seconds for --by time (default: 3600)"
+    )
+    split.add_argument(
+        "--max-open", type=int, default=32, help="Most output files kept open at once for --by time (default: 32)"
+    )
+    return parser.parse_args()
+
+
+def iter_capture(path):
+    """Yield (link type, nanosecond flag) first, then (nanosecond timestamp, wire length, data) records."""
+    stream = open_input(path)
+    pcap_header = read_pcap_header(stream)
+    if pcap_header:
+        endian, nano, linktype = pcap_header
+        yield linktype, nano
+        scale = 1 if nano else 1000
+        with stream:
+            for sec, frac, wirelen, data in iter_records(stream, pcap_header):
+                yield sec * 1000000000 + frac * scale, wirelen, data
+        return
+    # pcapng and other formats go through Scapy
+    with PcapReader(stream) as reader:
+        first = True
+        for packet in reader:
+            if first:
+                yield conf.l2types.layer2num.get(type(packet), LINKTYPE_ETHERNET), False
+                first = False
+            data = bytes(packet)
+            yield int(packet.time * 1000000000), packet.wirelen or len(data), data
+    if first:
+        yield None, False
+
+
+def open_capture(path):
+    """Start reading a capture; returns (link type, nanosecond flag, record iterator)."""
+    records = iter_capture(path)
+    linktype, nano = next(records)
+    return linktype, nano, records
+
+
+def write_ns_record(out, timestamp, wirelen, data, nano):
+    """Write one record from a nanosecond timestamp at the output file's resolution."""
+    sec, frac = divmod(timestamp, 1000000000)
+    if not nano:
+        frac //= 1000
+    out.write(struct.pack("=IIII", sec, frac, len(data), wirelen))
+    out.write(data)
+
+
+def merge(args, log):
+    """Merge the input captures through a heap keyed on timestamp."""
+    inputs = []
+    linktype = None
+    nano = False
+    for path in args.infiles:
+        file_linktype, file_nano, records = open_capture(path)
+        if file_linktype is None:
+            continue
+        nano = nano or file_nano
+        if linktype is not None and file_linktype != linktype:
+            print(f"Error: {path} has link type {file_linktype}, expected {linktype}", file=log)
+            sys.exit(1)
+        linktype = file_linktype
+        inputs.append(records)
+    if linktype is None:
+        print("Error: no packets to merge", file=log)
+        sys.exit(1)
+
+    count = 0
+    with open_output(args.outfile) as out:
+        write_pcap_header(out, linktype, nano)
+        # heapq.merge keeps one pending record per input; ties keep the input file order
+        for timestamp, wirelen, data in heapq.merge(*inputs, key=lambda record: record[0]):
+            write_ns_record(out, timestamp, wirelen, data, nano)
+            count += 1
+    print(f"Merged {count} packets from {len(args.infiles)} files into {args.outfile}", file=log)
+
+
+def flow_hash(data, linktype):
+    """Direction-independent hash of a frame's IP 5-tuple (or MAC pair for non-IP Ethernet)."""
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return 0
+        offset = 12
+        ethertype = struct.unpack_from("!H", data, offset)[0]
+        while ethertype in ETH_VLAN_TYPES and len(data) >= offset + 6:
+            offset += 4
+            ethertype = struct.unpack_from("!H", data, offset)[0]
+        offset += 2
+        if ethertype not in (0x0800, 0x86DD):
+            return zlib.crc32(b"".join(sorted((data[0:6], data[6:12]))))
+    elif linktype in LINKTYPE_RAW:
+        offset = 0
+    else:
+        return 0
+
+    if len(data) >= offset + 20 and data[offset] >> 4 == 4:
+        proto = data[offset + 9]
+        src, dst = data[offset + 12:offset + 16], data[offset + 16:offset + 20]
+        l4 = offset + (data[offset] & 0x0F) * 4
+        fragmented = struct.unpack_from("!H", data, offset + 6)[0] & 0x3FFF
+    elif len(data) >= offset + 40 and data[offset] >> 4 == 6:
+        proto = data[offset + 6]
+        src, dst = data[offset + 8:offset + 24], data[offset + 24:offset + 40]
+        l4 = offset + 40
+        fragmented = False
+    else:
+        return 0
+    sport = dport = b""
+    # Fragments keep to the address pair so every fragment of a datagram lands in the same file
+    if proto in (6, 17) and not fragmented and len(data) >= l4 + 4:
+        sport, dport = data[l4:l4 + 2], data[l4 + 2:l4 + 4]
+    endpoints = sorted((src + sport, dst + dport))
+    return zlib.crc32(bytes([proto]) + endpoints[0] + endpoints[1])
+
+
+class WriterPool:
+    """Output files keyed by name, keeping at most max_open of them open (least recently used closed first)."""
+
+    def __init__(self, linktype, nano, max_open):
+        self.linktype = linktype
+        self.nano = nano
+        self.max_open = max_open
+        self.open_files = OrderedDict()
+        self.created = set()
+
+    def write(self, path, timestamp, wirelen, data):
+        """Append a record to the named output, opening or reopening it as needed."""
+        out = self.open_files.get(path)
+        if out is None:
+            if len(self.open_files) >= self.max_open:
+                self.open_files.popitem(last=False)[1].close()
+            if path in self.created:
+                out = open(path, "ab")
+            else:
+                out = open(path, "wb")
+                write_pcap_header(out, self.linktype, self.nano)
+                self.created.add(path)
+            self.open_files[path] = out
+        else:
+            self.open_files.move_to_end(path)
+        write_ns_record(out, timestamp, wirelen, data, self.nano)
+
+    def close(self):
+        """Close every open output file."""
+        for out in self.open_files.values():
+            out.close()
+        self.open_files.clear()
+
+
+def split(args, log):
+    """Split the input capture by flow hash or time window."""
+    linktype, nano, records = open_capture(args.infile)
+    if linktype is None:
+        print("Error: no packets to split", file=log)
+        sys.exit(1)
+    directory = os.path.dirname(args.prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if args.by == "flow":
+        # One writer per bucket, all open for the whole pass
+        pool = WriterPool(linktype, nano, args.files)
+        paths = [f"{args.prefix}_{bucket:03d}.pcap" for bucket in range(args.files)]
+
+        def output_path(timestamp, data):
+            return paths[flow_hash(data, linktype) % args.files]
+    else:
+        pool = WriterPool(linktype, nano, args.max_open)
+        interval = int(args.interval * 1000000000)
+
+        def output_path(timestamp, data):
+            start = datetime.fromtimestamp(timestamp // interval * interval / 1e9, timezone.utc)
+            return f"{args.prefix}_{start.strftime('%Y%m%d_%H%M%S')}.pcap"
+
+    count = 0
+    try:
+        for timestamp, wirelen, data in records:
+            pool.write(output_path(timestamp, data), timestamp, wirelen, data)
+            count += 1
+    finally:
+        pool.close()
+    print(f"Split {count} packets into {len(pool.created)} files with prefix {args.prefix}", file=log)
+
+
+def validate_arguments(args):
+    """Validate command-line arguments."""
+    if args.command == "split":
+        if args.files < 1:
+            print("Error: --files must be at least 1")
+            sys.exit(1)
+        if args.interval < 1:
+            # Output files are named by the window start to the second
+            print("Error: --interval must be at least 1 second")
+            sys.exit(1)
+        if args.max_open < 1:
+            print("Error: --max-open must be at least 1")
+            sys.exit(1)
+
+
+def main():
+    """Main function to merge or split PCAP files."""
+    args = parse_arguments()
+    validate_arguments(args)
+    # Keep stdout clean for the capture when writing to it
+    log = sys.stderr if getattr(args, "outfile", None) == "-" else sys.stdout
+    try:
+        if args.command == "merge":
+            merge(args, log)
+        else:
+            split(args, log)
+    except OSError as e:
+        print(f"Error: {e}", file=log)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,35 @@
 """
 PcapRewrite: A private tool for editing PCAP files.
 Modifies Ethernet MAC addresses, IPv4/IPv6 addresses, and TCP/UDP ports.
+Packets are streamed one at a time, so memory use does not grow with the capture size.
+Ethernet captures in classic PCAP format are patched in place in the raw record bytes,
+with checksums updated incrementally; other packets go through Scapy.
+A map file can remap many addresses and ports, or anonymize addresses, in one pass.
 For authorized, personal use only. Do not share or distribute.
 """
 
 import argparse
+import hashlib
+import hmac
+import ipaddress
+import socket
+import struct
 import sys
-from scapy.all import rdpcap, wrpcap, Ether, IP, IPv6, TCP, UDP
+import time
+from collections import Counter
+from scapy.all import PcapReader, PcapWriter, Ether, IP, IPv6, TCP, UDP
+
+# Classic PCAP magic numbers: (struct byte order, nanosecond timestamps)
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", False),
+    b"\xa1\xb2\xc3\xd4": (">", False),
+    b"\x4d\x3c\xb2\xa1": ("<", True),
+    b"\xa1\xb2\x3c\x4d": (">", True),
+}
+LINKTYPE_ETHERNET = 1
+ETH_VLAN_TYPES = (0x8100, 0x88A8)
+# Unique addresses remembered by a rewrite map before its caches are reset
+MAP_CACHE_SIZE = 1 << 20
 
 
 def parse_arguments():
@@ -16,10 +39,10 @@ def parse_arguments():
         description="PcapRewrite: Modify packet headers in PCAP files."
     )
     parser.add_argument(
-        "--infile", required=True, help="Input PCAP file path (e.g., input.pcap)"
+        "--infile", required=True, help="Input PCAP file path (e.g., input.pcap), or - for stdin"
     )
     parser.add_argument(
-        "--outfile", required=True, help="Output PCAP file path (e.g., output.pcap)"
+        "--outfile", required=True, help="Output PCAP file path (e.g., output.pcap), or - for stdout"
     )
     parser.add_argument(
         "--src-mac", help="New source MAC address (e.g., 00:01:02:03:04:05)"
@@ -40,7 +63,34 @@ def parse_arguments():
         "--dst-port", type=int, help="New destination port for TCP/UDP (1-65535)"
     )
     parser.add_argument(
-        "--verbose", action="store_true", help="Enable verbose output for debugging"
+        "--map",
+        help="Rules file of ip/mac/port mappings and an optional anonymize key (see README)",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Show sampled packets and periodic statistics for debugging",
+    )
+    parser.add_argument(
+        "--sample-every",
+        type=int,
+        help="Show every Nth rewritten packet (default: 1000 with --verbose, otherwise none)",
+    )
+    parser.add_argument(
+        "--sample-errors",
+        type=int,
+        default=5,
+        help="Report at most this many packets per error type (default: 5)",
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        help="Seconds between progress reports (default: 5 with --verbose, otherwise none)",
+    )
+    parser.add_argument(
+        "--no-fast-path",
+        action="store_true",
+        help="Rebuild every packet with Scapy instead of patching raw bytes",
     )
     return parser.parse_args()
 
@@ -53,6 +103,10 @@ def validate_arguments(args):
     if args.dst_port and (args.dst_port < 1 or args.dst_port > 65535):
         print("Error: Destination port must be between 1 and 65535")
         sys.exit(1)
+    for option in ("sample_every", "sample_errors", "stats_interval"):
+        if getattr(args, option) is not None and getattr(args, option) < 0:
+            print(f"Error: --{option.replace('_', '-')} cannot be negative")
+            sys.exit(1)
     # Basic MAC address format check (not exhaustive)
     for mac in [args.src_mac, args.dst_mac]:
         if mac and not all(c in "0123456789abcdefABCDEF:" for c in mac):
@@ -60,82 +114,585 @@ def validate_arguments(args):
             sys.exit(1)
 
 
-def modify_packet(packet, args):
-    """Modify a single packet based on provided arguments."""
-    # Create a copy to avoid altering the original
-    new_packet = packet.copy()
+class RewriteStats:
+    """Counters for a rewrite run, with sampled packet output and periodic progress reports."""
+
+    def __init__(self, out, interval=0, sample_every=0, sample_errors=5):
+        self.out = out
+        self.interval = interval
+        self.sample_every = sample_every
+        self.sample_errors = sample_errors
+        self.started = self.last_report = time.time()
+        self.packets = 0
+        self.bytes = 0
+        self.unchanged = 0
+        self.fallbacks = 0
+        self.changes = 0
+        self.fields = Counter()
+        self.errors = Counter()
+
+    def changed(self, field):
+        """Count one rewritten field, named layer.field (e.g. ip.src)."""
+        self.fields[field] += 1
+        self.changes += 1
+
+    def checkpoint(self):
+        """Snapshot the field counters before an attempt that may be abandoned."""
+        return self.changes, self.fields.copy()
+
+    def rollback(self, checkpoint):
+        """Restore the field counters of a checkpoint, for a packet that is copied unchanged after all."""
+        self.changes, self.fields = checkpoint
+
+    def record(self, number, size, unchanged, error=None, packet=None):
+        """Account one written packet; packet is a callable that builds it for display only when sampled."""
+        self.packets += 1
+        self.bytes += size
+        if unchanged:
+            self.unchanged += 1
+        if error is not None:
+            kind = type(error).__name__
+            self.errors[kind] += 1
+            if self.errors[kind] <= self.sample_errors:
+                print(f"Warning: Skipping packet {number} due to error: {error}", file=self.out)
+        elif self.sample_every and number % self.sample_every == 0:
+            print(f"Packet {number}:", file=self.out)
+            print(packet().show(dump=True), file=self.out)
+        # Checking the clock on every packet would cost more than the rest of the bookkeeping
+        if self.interval and not self.packets % 1024 and time.time() - self.last_report >= self.interval:
+            self.report()
+
+    def report(self):
+        """Print a one-line progress report."""
+        self.last_report = time.time()
+        elapsed = max(self.last_report - self.started, 1e-6)
+        print(
+            f"Progress: {self.packets} packets, {self.bytes / 1e6:.1f} MB "
+            f"({self.packets / elapsed:.0f} packets/sec, {self.bytes / 1e6 / elapsed:.2f} MB/s)",
+            file=self.out,
+        )
+
+    def summary(self):
+        """Print the end-of-run totals."""
+        elapsed = max(time.time() - self.started, 1e-6)
+        print(
+            f"Rewrote {self.packets} packets ({self.bytes / 1e6:.1f} MB) in {elapsed:.1f}s "
+            f"({self.packets / elapsed:.0f} packets/sec, {self.bytes / 1e6 / elapsed:.2f} MB/s)",
+            file=self.out,
+        )
+        if self.fields:
+            fields = ", ".join(f"{name}={count}" for name, count in sorted(self.fields.items()))
+            print(f"Fields rewritten: {fields}", file=self.out)
+        print(f"Unchanged: {self.unchanged}, rebuilt with Scapy: {self.fallbacks}", file=self.out)
+        if self.errors:
+            errors = ", ".join(f"{name}={count}" for name, count in self.errors.most_common())
+            print(f"Errors (copied unchanged): {errors}", file=self.out)
+
+
+class PrefixTrie:
+    """Binary trie of IP prefixes for longest-prefix-match lookups."""
+
+    def __init__(self):
+        # Each node is [zero child, one child, value]
+        self.root = [None, None, None]
+
+    def insert(self, address, prefixlen, value):
+        """Store a value for the prefix of the given packed address."""
+        bits = int.from_bytes(address, "big")
+        width = len(address) * 8
+        node = self.root
+        for i in range(prefixlen):
+            bit = (bits >> (width - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        node[2] = value
+
+    def lookup(self, address):
+        """Return the value of the longest stored prefix covering the packed address, or None."""
+        bits = int.from_bytes(address, "big")
+        width = len(address) * 8
+        node = self.root
+        found = node[2]
+        for i in range(width):
+            node = node[(bits >> (width - 1 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                found = node[2]
+        return found
+
+
+class RewriteMap:
+    """Address and port rules loaded from a --map file.
+
+    Lines are "ip <cidr> <cidr>", "mac <mac> <mac>", "port <port> <port>" or "anonymize <key>".
+    IP rules keep the host bits and use the longest matching prefix; with an anonymize key, addresses
+    no rule covers are anonymized prefix-preservingly (Crypto-PAn style, HMAC-SHA256 as the PRF).
+    """
+
+    def __init__(self):
+        self.tries = {4: PrefixTrie(), 16: PrefixTrie()}
+        self.macs = {}
+        self.ports = {}
+        self.key = None
+        self.ip_rules = 0
+        self.cache = {}
+        self.flip_cache = {}
+
+    @classmethod
+    def from_file(cls, path):
+        """Compile a rules file; raises ValueError with the offending line number."""
+        rules = cls()
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                fields = line.split("#", 1)[0].split()
+                if not fields:
+                    continue
+                try:
+                    rules.add(fields)
+                except ValueError as e:
+                    raise ValueError(f"{path}:{number}: {e}")
+        return rules
+
+    def add(self, fields):
+        """Add one parsed rule line."""
+        kind = fields[0].lower()
+        if kind == "anonymize" and len(fields) == 2:
+            self.key = fields[1].encode()
+        elif kind == "ip" and len(fields) == 3:
+            old = ipaddress.ip_network(fields[1], strict=False)
+            new = ipaddress.ip_network(fields[2], strict=False)
+            if old.version != new.version or old.prefixlen != new.prefixlen:
+                raise ValueError("ip rules must map between prefixes of the same family and length")
+            self.tries[len(old.network_address.packed)].insert(
+                old.network_address.packed, old.prefixlen, (int(new.network_address), int(old.hostmask))
+            )
+            self.ip_rules += 1
+        elif kind == "mac" and len(fields) == 3:
+            old, new = parse_mac(fields[1]), parse_mac(fields[2])
+            if old is None or new is None:
+                raise ValueError(f"invalid MAC address in {' '.join(fields)}")
+            self.macs[old] = new
+        elif kind == "port" and len(fields) == 3:
+            old, new = int(fields[1]), int(fields[2])
+            if not (1 <= old <= 65535 and 1 <= new <= 65535):
+                raise ValueError("ports must be between 1 and 65535")
+            self.ports[old] = new
+        else:
+            raise ValueError(f"unrecognized rule: {' '.join(fields)}")
+
+    @property
+    def rewrites_ips(self):
+        """True if any address can change."""
+        return bool(self.ip_rules or self.key)
+
+    def ip(self, address):
+        """Map a packed IPv4/IPv6 address."""
+        mapped = self.cache.get(address)
+        if mapped is None:
+            if len(self.cache) >= MAP_CACHE_SIZE:
+                self.cache.clear()
+            rule = self.tries[len(address)].lookup(address)
+            if rule:
+                network, hostmask = rule
+                mapped = (network | (int.from_bytes(address, "big") & hostmask)).to_bytes(len(address), "big")
+            elif self.key:
+                mapped = self.anonymize(address)
+            else:
+                mapped = address
+            self.cache[address] = mapped
+        return mapped
+
+    def anonymize(self, address):
+        """Prefix-preserving anonymization: bit i is flipped by a keyed function of the first i bits."""
+        if len(self.flip_cache) >= MAP_CACHE_SIZE:
+            self.flip_cache.clear()
+        bits = int.from_bytes(address, "big")
+        width = len(address) * 8
+        result = 0
+        for i in range(width):
+            prefix = (width, i, bits >> (width - i))
+            flip = self.flip_cache.get(prefix)
+            if flip is None:
+                flip = hmac.new(self.key, repr(prefix).encode(), hashlib.sha256).digest()[0] & 1
+                self.flip_cache[prefix] = flip
+            result = (result << 1) | (((bits >> (width - 1 - i)) & 1) ^ flip)
+        return result.to_bytes(len(address), "big")
+
+    def mac(self, mac):
+        """Map a 6-byte MAC address."""
+        return self.macs.get(mac, mac)
+
+    def ip_text(self, address):
+        """Map an IP address string, as used by Scapy fields."""
+        family = socket.AF_INET6 if ":" in address else socket.AF_INET
+        return socket.inet_ntop(family, self.ip(socket.inet_pton(family, address)))
+
+    def mac_text(self, mac):
+        """Map a MAC address string, as used by Scapy fields."""
+        return ":".join(f"{octet:02x}" for octet in self.mac(parse_mac(mac)))
+
+
+def modify_packet(packet, args, rules=None, stats=None):
+    """Modify a single packet in place based on provided arguments and map rules."""
+    # The reader hands over a fresh packet per record, so no copy is needed;
+    # the unmodified bytes stay available in packet.original
+    new_packet = packet
+
+    def update(layer, name, field, value):
+        old = getattr(new_packet[layer], field)
+        setattr(new_packet[layer], field, value)
+        if stats and str(value).lower() != str(old).lower():
+            stats.changed(f"{name}.{field}")
 
     # Layer 2: Ethernet MAC addresses
     if Ether in new_packet:
         if args.src_mac:
-            new_packet[Ether].src = args.src_mac
+            update(Ether, "ether", "src", args.src_mac)
+        elif rules and rules.macs:
+            update(Ether, "ether", "src", rules.mac_text(new_packet[Ether].src))
         if args.dst_mac:
-            new_packet[Ether].dst = args.dst_mac
+            update(Ether, "ether", "dst", args.dst_mac)
+        elif rules and rules.macs:
+            update(Ether, "ether", "dst", rules.mac_text(new_packet[Ether].dst))
 
     # Layer 3: IPv4 or IPv6 addresses
-    if IP in new_packet and (args.src_ip or args.dst_ip):
-        if args.src_ip:
-            new_packet[IP].src = args.src_ip
-        if args.dst_ip:
-            new_packet[IP].dst = args.dst_ip
-        # Remove checksum to trigger recalculation
-        del new_packet[IP].chksum
-
-    elif IPv6 in new_packet and (args.src_ip or args.dst_ip):
-        if args.src_ip:
-            new_packet[IPv6].src = args.src_ip
-        if args.dst_ip:
-            new_packet[IPv6].dst = args.dst_ip
+    layer = IP if IP in new_packet else IPv6 if IPv6 in new_packet else None
+    if layer and (args.src_ip or args.dst_ip or (rules and rules.rewrites_ips)):
+        changed = bool(args.src_ip or args.dst_ip)
+        for field, fixed in (("src", args.src_ip), ("dst", args.dst_ip)):
+            if not fixed and not (rules and rules.rewrites_ips):
+                continue
+            value = fixed or rules.ip_text(getattr(new_packet[layer], field))
+            if fixed or value != getattr(new_packet[layer], field):
+                update(layer, "ip" if layer == IP else "ipv6", field, value)
+                changed = True
+        if changed:
+            # Remove checksums to trigger recalculation
+            if layer == IP:
+                del new_packet[IP].chksum
+            clear_l4_checksum(new_packet)
 
     # Layer 4: TCP or UDP ports
-    if (TCP in new_packet or UDP in new_packet) and (args.src_port or args.dst_port):
+    if (TCP in new_packet or UDP in new_packet) and (args.src_port or args.dst_port or (rules and rules.ports)):
         proto = TCP if TCP in new_packet else UDP
-        if args.src_port:
-            new_packet[proto].sport = args.src_port
-        if args.dst_port:
-            new_packet[proto].dport = args.dst_port
+        changed = bool(args.src_port or args.dst_port)
+        for field, fixed in (("sport", args.src_port), ("dport", args.dst_port)):
+            if not fixed and not (rules and rules.ports):
+                continue
+            value = fixed or rules.ports.get(getattr(new_packet[proto], field), getattr(new_packet[proto], field))
+            if fixed or value != getattr(new_packet[proto], field):
+                update(proto, "tcp" if proto == TCP else "udp", field, value)
+                changed = True
         # Remove checksum to trigger recalculation
-        if proto == TCP:
-            del new_packet[TCP].chksum
-        else:
-            del new_packet[UDP].chksum
+        if changed:
+            del new_packet[proto].chksum
 
     return new_packet
 
 
+def clear_l4_checksum(packet):
+    """Remove the TCP/UDP checksum, which covers the IP addresses through the pseudo-header."""
+    if TCP in packet:
+        del packet[TCP].chksum
+    elif UDP in packet:
+        del packet[UDP].chksum
+
+
+def checksum_update(checksum, old, new):
+    """Incrementally update a 16-bit ones' complement checksum for a field change (RFC 1624, eqn. 3)."""
+    words = len(old) // 2
+    total = (~checksum & 0xFFFF) + sum(~w & 0xFFFF for w in struct.unpack(f"!{words}H", old))
+    total += sum(struct.unpack(f"!{words}H", new))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def patch_field(frame, offset, new, checksums):
+    """Overwrite a field and fold the change into each (offset, is_udp) checksum; returns True if it changed."""
+    old = bytes(frame[offset:offset + len(new)])
+    if old == new:
+        return False
+    frame[offset:offset + len(new)] = new
+    for checksum_offset, is_udp in checksums:
+        checksum = checksum_update(
+            struct.unpack_from("!H", frame, checksum_offset)[0], old, new
+        )
+        if is_udp and checksum == 0:
+            # A zero UDP checksum means "no checksum", so it is sent as all ones
+            checksum = 0xFFFF
+        struct.pack_into("!H", frame, checksum_offset, checksum)
+    return True
+
+
+def parse_mac(mac):
+    """Convert a MAC address string to 6 bytes, or None if it is not in XX:XX:XX:XX:XX:XX form."""
+    try:
+        octets = bytes(int(part, 16) for part in mac.split(":"))
+    except ValueError:
+        return None
+    return octets if len(octets) == 6 else None
+
+
+def parse_ip(address):
+    """Convert an IP address string to (version, packed bytes), or None for hostnames and invalid input."""
+    for family, version in ((socket.AF_INET, 4), (socket.AF_INET6, 6)):
+        try:
+            return version, socket.inet_pton(family, address)
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def prepare_fast_path(args, rules=None):
+    """Pre-encode the requested header values, or return None if the fast path cannot apply them."""
+    plan = {"src_mac": None, "dst_mac": None, "src_ip": None, "dst_ip": None, "sport": None, "dport": None}
+    for key, mac in (("src_mac", args.src_mac), ("dst_mac", args.dst_mac)):
+        if mac:
+            plan[key] = parse_mac(mac)
+            if plan[key] is None:
+                return None
+    for key, address in (("src_ip", args.src_ip), ("dst_ip", args.dst_ip)):
+        if address:
+            plan[key] = parse_ip(address)
+            if plan[key] is None:
+                return None
+    for key, port in (("sport", args.src_port), ("dport", args.dst_port)):
+        if port:
+            plan[key] = struct.pack("!H", port)
+    plan["l3"] = bool(plan["src_ip"] or plan["dst_ip"] or (rules and rules.rewrites_ips))
+    plan["l4"] = bool(plan["sport"] or plan["dport"] or (rules and rules.ports))
+    return plan
+
+
+def rewrite_frame(frame, plan, rules=None, stats=None):
+    """Patch an Ethernet frame in place; returns False, leaving it untouched, if it must go through Scapy."""
+    if len(frame) < 14:
+        return False
+    addresses = []
+    ports = []
+    if plan["l3"] or plan["l4"]:
+        offset = 12
+        ethertype = struct.unpack_from("!H", frame, offset)[0]
+        while ethertype in ETH_VLAN_TYPES and len(frame) >= offset + 6:
+            offset += 4
+            ethertype = struct.unpack_from("!H", frame, offset)[0]
+        offset += 2
+
+        if ethertype == 0x0800 and len(frame) >= offset + 20 and frame[offset] >> 4 == 4:
+            version = 4
+            header_len = (frame[offset] & 0x0F) * 4
+            total_len, flags_frag = struct.unpack_from("!H2xH", frame, offset + 2)
+            proto = frame[offset + 9]
+            if header_len < 20 or total_len < header_len or len(frame) < offset + total_len:
+                return False
+            if flags_frag & 0x3FFF:
+                # Fragments: Scapy would checksum only this fragment's bytes
+                return False
+            l4 = offset + header_len
+            addr_offsets = (offset + 12, offset + 16)
+            end = offset + total_len
+        elif ethertype == 0x86DD and len(frame) >= offset + 40 and frame[offset] >> 4 == 6:
+            version = 6
+            payload_len = struct.unpack_from("!H", frame, offset + 4)[0]
+            proto = frame[offset + 6]
+            l4 = offset + 40
+            addr_offsets = (offset + 8, offset + 24)
+            end = l4 + payload_len
+            if len(frame) < end:
+                return False
+        else:
+            # Not IP: nothing beyond the MAC addresses to rewrite
+            version = None
+
+        if version:
+            # Only plain TCP/UDP is patched here; ICMP, tunnels and IPv6 extension headers go through Scapy
+            if proto == 6 and end - l4 >= 20:
+                l4_checksum = (l4 + 16, False)
+                l4_name = "tcp"
+            elif proto == 17 and end - l4 >= 8:
+                l4_checksum = (l4 + 6, True)
+                l4_name = "udp"
+                if struct.unpack_from("!H", frame, l4 + 6)[0] == 0:
+                    # No UDP checksum was sent; Scapy computes one from scratch
+                    return False
+            else:
+                return False
+            ip_checksums = [l4_checksum]
+            if version == 4:
+                ip_checksums.append((offset + 10, False))
+            ip_name = "ip" if version == 4 else "ipv6"
+            for field, address, addr_offset in zip(("src", "dst"), (plan["src_ip"], plan["dst_ip"]), addr_offsets):
+                if address:
+                    if address[0] != version:
+                        return False
+                    addresses.append((f"{ip_name}.{field}", addr_offset, address[1], ip_checksums))
+                elif rules and rules.rewrites_ips:
+                    size = 4 if version == 4 else 16
+                    mapped = rules.ip(bytes(frame[addr_offset:addr_offset + size]))
+                    addresses.append((f"{ip_name}.{field}", addr_offset, mapped, ip_checksums))
+            for field, port, port_offset in (("sport", plan["sport"], l4), ("dport", plan["dport"], l4 + 2)):
+                if not port and rules and rules.ports:
+                    old = struct.unpack_from("!H", frame, port_offset)[0]
+                    port = struct.pack("!H", rules.ports.get(old, old))
+                if port:
+                    ports.append((f"{l4_name}.{field}", port_offset, port, [l4_checksum]))
+
+    # Everything checked out; patch the frame
+    for name, mac, mac_offset in (("ether.dst", plan["dst_mac"], 0), ("ether.src", plan["src_mac"], 6)):
+        if not mac and rules and rules.macs:
+            mac = rules.mac(bytes(frame[mac_offset:mac_offset + 6]))
+        if mac and patch_field(frame, mac_offset, mac, ()) and stats:
+            stats.changed(name)
+    for name, field_offset, value, checksums in addresses + ports:
+        if patch_field(frame, field_offset, value, checksums) and stats:
+            stats.changed(name)
+    return True
+
+
+def read_pcap_header(stream):
+    """Peek at a classic PCAP global header; returns (byte order, nanosecond flag, link type) or None."""
+    header = stream.peek(24)[:24]
+    if len(header) < 24 or header[:4] not in PCAP_MAGIC:
+        return None
+    endian, nano = PCAP_MAGIC[header[:4]]
+    return endian, nano, struct.unpack_from(endian + "I", header, 20)[0]
+
+
+def iter_records(stream, pcap_header):
+    """Yield (seconds, fraction, wire length, data) for each record of a classic PCAP stream."""
+    record = struct.Struct(pcap_header[0] + "IIII")
+    stream.read(24)
+    while True:
+        header = stream.read(16)
+        if len(header) < 16:
+            return
+        sec, frac, caplen, wirelen = record.unpack(header)
+        data = stream.read(caplen)
+        if len(data) < caplen:
+            return
+        yield sec, frac, wirelen, data
+
+
+def write_pcap_header(out, linktype, nano):
+    """Write a classic PCAP global header the same way Scapy's PcapWriter does."""
+    out.write(struct.pack("=IHHIIII", 0xA1B23C4D if nano else 0xA1B2C3D4, 2, 4, 0, 0, 65535, linktype))
+
+
+def write_record(out, sec, frac, wirelen, data):
+    """Write one PCAP record."""
+    out.write(struct.pack("=IIII", sec, frac, len(data), wirelen))
+    out.write(data)
+
+
+def open_input(infile):
+    """Open the input capture as a buffered binary stream, or stdin for '-'."""
+    return sys.stdin.buffer if infile == "-" else open(infile, "rb")
+
+
+def open_output(outfile):
+    """Open the output capture as a binary stream, or stdout for '-'."""
+    return sys.stdout.buffer if outfile == "-" else open(outfile, "wb")
+
+
+def open_writer(outfile, reader):
+    """Open a streaming PCAP writer on a file path, or stdout for '-', keeping the input link type."""
+    return PcapWriter(
+        open_output(outfile),
+        linktype=getattr(reader, "linktype", None),
+        nano=getattr(reader, "nano", False),
+    )
+
+
+def rewrite_raw(stream, pcap_header, plan, rules, args, stats):
+    """Rewrite a classic Ethernet PCAP record by record, falling back to Scapy per packet."""
+    endian, nano, linktype = pcap_header
+    with stream, open_output(args.outfile) as output:
+        write_pcap_header(output, linktype, nano)
+        for i, (sec, frac, wirelen, data) in enumerate(iter_records(stream, pcap_header), 1):
+            frame = bytearray(data)
+            changes = stats.changes
+            error = None
+            # Truncated records cannot be checksummed the way Scapy would
+            if wirelen != len(data) or not rewrite_frame(frame, plan, rules, stats):
+                stats.fallbacks += 1
+                checkpoint = stats.checkpoint()
+                try:
+                    frame = bytes(modify_packet(Ether(data), args, rules, stats))
+                except Exception as e:
+                    error = e
+                    frame = data  # Copy unchanged
+                    stats.rollback(checkpoint)
+            write_record(output, sec, frac, wirelen, frame)
+            stats.record(i, len(frame), stats.changes == changes, error, lambda: Ether(frame))
+
+
+def rewrite_scapy(stream, rules, args, stats):
+    """Rewrite any capture format Scapy can read, one packet at a time."""
+    reader = PcapReader(stream)
+    with reader, open_writer(args.outfile, reader) as writer:
+        for i, packet in enumerate(reader, 1):
+            changes = stats.changes
+            stats.fallbacks += 1
+            checkpoint = stats.checkpoint()
+            try:
+                new_packet = modify_packet(packet, args, rules, stats)
+                writer.write(new_packet)
+                stats.record(i, len(packet.original), stats.changes == changes, packet=lambda: new_packet)
+            except Exception as e:
+                stats.rollback(checkpoint)
+                write_unchanged(writer, packet)  # Copy unchanged
+                stats.record(i, len(packet.original), True, e)
+
+
+def write_unchanged(writer, packet):
+    """Write the original bytes of a packet that could not be rewritten."""
+    unchanged = packet.__class__(packet.original)
+    unchanged.time = packet.time
+    unchanged.wirelen = packet.wirelen
+    writer.write(unchanged)
+
+
 def main():
     """Main function to process PCAP file."""
     args = parse_arguments()
     validate_arguments(args)
+    # Keep stdout clean for the capture when writing to it
+    out = sys.stderr if args.outfile == "-" else sys.stdout
 
-    # Read input PCAP
     try:
-        packets = rdpcap(args.infile)
+        rules = RewriteMap.from_file(args.map) if args.map else None
+    except (OSError, ValueError) as e:
+        print(f"Error loading map file: {e}", file=out)
+        sys.exit(1)
+
+    try:
+        stream = open_input(args.infile)
+        pcap_header = read_pcap_header(stream)
     except Exception as e:
-        print(f"Error reading PCAP file: {e}")
+        print(f"Error reading PCAP file: {e}", file=out)
         sys.exit(1)
+    plan = None if args.no_fast_path else prepare_fast_path(args, rules)
+    # Verbose runs sample packets and report progress instead of showing every packet
+    stats = RewriteStats(
+        out,
+        interval=args.stats_interval if args.stats_interval is not None else (5 if args.verbose else 0),
+        sample_every=args.sample_every if args.sample_every is not None else (1000 if args.verbose else 0),
+        sample_errors=args.sample_errors,
+    )
 
-    # Process packets
-    modified_packets = []
-    for i, packet in enumerate(packets, 1):
-        try:
-            new_packet = modify_packet(packet, args)
-            modified_packets.append(new_packet)
-
-            # Verbose output
-            if args.verbose:
-                print(f"Packet {i}:")
-                new_packet.show()
-        except Exception as e:
-            print(f"Warning: Skipping packet {i} due to error: {e}")
-            modified_packets.append(packet)  # Copy unchanged
-
-    # Write output PCAP
+    # Rewrite and write one packet at a time
     try:
-        wrpcap(args.outfile, modified_packets)
-        print(f"Modified PCAP written to {args.outfile}")
+        if plan and pcap_header and pcap_header[2] == LINKTYPE_ETHERNET:
+            rewrite_raw(stream, pcap_header, plan, rules, args, stats)
+        else:
+            rewrite_scapy(stream, rules, args, stats)
+        stats.summary()
+        print(f"Modified PCAP written to {args.outfile}", file=out)
     except Exception as e:
-        print(f"Error writing PCAP file: {e}")
+        print(f"Error writing PCAP file: {e}", file=out)
         sys.exit(1)
 
 
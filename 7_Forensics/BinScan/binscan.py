@@ -1,12 +1,27 @@
 import argparse
 import re
 import csv
+import hashlib
+import io
+import mmap
+import multiprocessing
 import os
 from pathlib import Path
 import sys
+import tempfile
+import zipfile
 import binascii
-import subprocess
+import struct
+import zlib
+from contextlib import redirect_stdout
 from datetime import datetime
+from bisect import bisect_left
+from itertools import islice, repeat
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; without it candidates come from a compiled regular expression
+    np = None
 
 def get_signatures():
     """Define file signatures for common formats."""
@@ -20,102 +35,771 @@ def get_signatures():
         {'type': 'GZIP', 'signature': b'\x1F\x8B\x08', 'extension': '.gz'}
     ]
 
-def scan_file(file_path, signatures, chunk_size=8192):
-    """Scan a file for signatures and return matches with offsets."""
-    results = []
-    try:
-        with open(file_path, 'rb') as f:
-            offset = 0
-            while True:
-                chunk = f.read(chunk_size)
-                if not chunk:
-                    break
-                for sig in signatures:
+def trie_pattern(node):
+    """Turn a byte trie into a regular expression that matches where any of its signatures starts."""
+    if None in node:
+        # The shortest signature on this path already matched; longer ones are confirmed per candidate
+        return b''
+    branches = [re.escape(bytes([byte])) + trie_pattern(child) for byte, child in sorted(node.items())]
+    return branches[0] if len(branches) == 1 else b'(?:' + b'|'.join(branches) + b')'
+
+class SignatureScanner:
+    """Single-pass multi-signature matcher.
+
+    Candidate offsets come from one pass over the data: with NumPy, a lookup table of every signature's
+    first two bytes indexed by the two bytes at each offset, whose cost does not depend on the number of
+    signatures; otherwise a trie-shaped regular expression of all signatures. Each candidate is confirmed
+    against the signatures sharing its first byte. Fixed-offset signatures (like TAR) are checked directly.
+    """
+
+    def __init__(self, signatures):
+        self.fixed = [sig for sig in signatures if sig.get('offset', 0)]
+        self.buckets = {}
+        trie = {}
+        prefixes = np.zeros(65536, dtype=bool) if np is not None else None
+        for sig in signatures:
+            if sig.get('offset', 0):
+                continue
+            signature = sig['signature']
+            self.buckets.setdefault(signature[0], []).append(sig)
+            node = trie
+            for byte in signature:
+                node = node.setdefault(byte, {})
+            node[None] = {}
+            if prefixes is not None:
+                if len(signature) > 1:
+                    prefixes[signature[0] << 8 | signature[1]] = True
+                else:
+                    prefixes[signature[0] << 8:(signature[0] + 1) << 8] = True
+        self.prefixes = prefixes if trie else None
+        self.pattern = re.compile(trie_pattern(trie), re.DOTALL) if trie else None
+        # A signature starting near the end of a range may extend this far past it
+        self.overlap = max((len(sig['signature']) for sig in signatures), default=1) - 1
+
+    def candidates(self, data, start, end):
+        """Yield offsets in [start, end) where some floating signature may start."""
+        if self.prefixes is not None:
+            block = np.frombuffer(data, dtype=np.uint8, count=min(end + 1, len(data)) - start, offset=start)
+            if start + len(block) == end:
+                # The last byte of the data has no successor; pair it with zero
+                block = np.append(block, np.uint8(0))
+            keys = block[:-1].astype(np.uint16) << 8 | block[1:]
+            for index in np.flatnonzero(self.prefixes[keys]).tolist():
+                yield start + index
+            return
+        search = self.pattern.search
+        search_end = min(end + self.overlap, len(data))
+        pos = start
+        while True:
+            match = search(data, pos, search_end)
+            if not match or match.start() >= end:
+                return
+            yield match.start()
+            pos = match.start() + 1
+
+    def scan(self, data, start, end):
+        """Return matches for signatures starting in data[start:end], sorted by offset."""
+        results = []
+        for sig in self.fixed:
+            signature, offset = sig['signature'], sig['offset']
+            if start <= offset < end and data[offset:offset + len(signature)] == signature:
+                results.append({'type': sig['type'], 'offset': offset, 'extension': sig['extension']})
+        if self.pattern:
+            for offset in self.candidates(data, start, end):
+                for sig in self.buckets[data[offset]]:
                     signature = sig['signature']
-                    sig_offset = sig.get('offset', 0)
-                    if sig_offset == 0:
-                        # Search for signature in chunk
-                        pos = 0
-                        while True:
-                            idx = chunk.find(signature, pos)
-                            if idx == -1:
-                                break
-                            results.append({
-                                'type': sig['type'],
-                                'offset': offset + idx,
-                                'extension': sig['extension']
-                            })
-                            pos = idx + 1
-                    elif offset <= sig_offset < offset + len(chunk):
-                        # Check specific offset for signatures like TAR
-                        if chunk[sig_offset - offset:sig_offset - offset + len(signature)] == signature:
-                            results.append({
-                                'type': sig['type'],
-                                'offset': sig_offset,
-                                'extension': sig['extension']
-                            })
-                offset += len(chunk)
-    except Exception as e:
-        print(f"[!] Error scanning {file_path}: {e}")
+                    if data[offset:offset + len(signature)] == signature:
+                        results.append({'type': sig['type'], 'offset': offset, 'extension': sig['extension']})
+        results.sort(key=lambda result: result['offset'])
+        return results
+
+def scan_range(data, scanner, start, end, chunk_size=1024 * 1024):
+    """Scan data[start:end] for signatures in blocks and return matches with offsets."""
+    results = []
+    # Blocks bound the work per search call; matches straddling a block or range boundary are still found
+    for block in range(start, end, chunk_size):
+        results.extend(scanner.scan(data, block, min(block + chunk_size, end)))
     return results
 
-def verify_file_type(file_path, offset, file_type):
-    """Verify file type using the 'file' command."""
+# Printable bytes are those counted by strings(1): tab and ASCII space through tilde.
+# No ASCII or UTF-16LE string spans a byte that is neither printable nor zero, or a pair of zero bytes
+STRING_BREAK = re.compile(b'[^\\t\\x20-\\x7e\\x00]|\\x00\\x00')
+
+def string_cut(data, pos):
+    """Return the first offset at or after pos where data can be split without splitting a string."""
+    if pos <= 0 or pos >= len(data):
+        return min(max(pos, 0), len(data))
+    match = STRING_BREAK.search(data, pos)
+    if not match:
+        return len(data)
+    # Split before a break byte, or between the two zeros of a pair
+    return match.start() + (data[match.start()] == 0)
+
+def runs(mask, min_length):
+    """Return (starts, ends) of the runs of True in a boolean array that are at least min_length long."""
+    # Erode the mask so position i stays True only when mask[i:i + min_length] all are; short runs
+    # vanish before the edge search, which keeps it cheap on noisy data
+    eroded = mask
+    window = 1
+    while window < min_length:
+        step = min(window, min_length - window)
+        eroded = eroded[:-step] & eroded[step:]
+        window += step
+    padded = np.zeros(len(eroded) + 2, dtype=bool)
+    padded[1:-1] = eroded
+    # Run edges alternate between starts and ends
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges[0::2], edges[1::2] + (min_length - 1)
+
+def block_strings(data, start, end, min_length):
+    """Return (offset, encoding, text) for ASCII and UTF-16LE strings in data[start:end], sorted by offset.
+
+    With NumPy, a printable-byte mask and run-length edges find every run at once; otherwise regular
+    expressions do the same over the mapped bytes.
+    """
+    found = []
+    if np is not None:
+        raw = data[start:end]
+        block = np.frombuffer(raw, dtype=np.uint8)
+        # Unsigned wrap-around turns the space-to-tilde range check into one comparison
+        printable = ((block - np.uint8(0x20)) < 0x5F) | (block == 0x09)
+        # Latin-1 maps bytes to code points one to one, so string slices of it are the decoded strings
+        text = raw.decode('latin-1')
+        firsts, lasts = runs(printable, min_length)
+        found.extend(zip((firsts + start).tolist(), repeat('ascii'),
+                         map(text.__getitem__, map(slice, firsts.tolist(), lasts.tolist()))))
+        # UTF-16LE characters are a printable byte followed by zero, at either byte alignment
+        characters = printable[:-1] & (block[1:] == 0)
+        for parity in (0, 1):
+            firsts, lasts = runs(characters[parity::2], min_length)
+            offsets = parity + 2 * firsts
+            # Every other byte of the run is the character, the zeros between them are skipped
+            found.extend(zip((offsets + start).tolist(), repeat('utf-16le'),
+                             map(text.__getitem__, map(slice, offsets.tolist(), (parity + 2 * lasts).tolist(), repeat(2)))))
+    else:
+        for match in re.finditer(b'[\\t\\x20-\\x7e]{%d,}' % min_length, data[start:end]):
+            found.append((start + match.start(), 'ascii', match.group().decode('ascii')))
+        for parity in (0, 1):
+            # Matching from each alignment finds the same characters as the NumPy path
+            for match in re.finditer(b'(?:[\\t\\x20-\\x7e]\\x00){%d,}' % min_length, data[start + parity:end]):
+                if match.start() % 2 == 0:
+                    found.append((start + parity + match.start(), 'utf-16le', match.group().decode('utf-16-le')))
+    found.sort()
+    return found
+
+def extract_strings(data, start, end, min_length, chunk_size=1024 * 1024):
+    """Return strings belonging to data[start:end], processed in blocks cut where no string can span.
+
+    Both ends are moved to a cut point, so every string lies in exactly one range of a sharded file.
+    """
+    found = []
+    pos, end = string_cut(data, start), string_cut(data, end)
+    while pos < end:
+        block_end = min(string_cut(data, pos + chunk_size), end)
+        found.extend(block_strings(data, pos, block_end, min_length))
+        pos = block_end
+    return found
+
+def validate_zip(data, offset):
+    """ZIP local file header: known version and compression method, sane name length."""
+    if offset + 30 > len(data):
+        return False
+    version, flags, method = struct.unpack_from('<HHH', data, offset + 4)
+    name_len, extra_len = struct.unpack_from('<HH', data, offset + 26)
+    return (version & 0xFF) <= 63 and method in (0, 1, 6, 8, 9, 12, 14, 93, 95, 98, 99) and \
+        0 < name_len <= 1024 and offset + 30 + name_len + extra_len <= len(data)
+
+def validate_png(data, offset):
+    """PNG: the first chunk is a 13-byte IHDR whose CRC matches."""
+    if offset + 33 > len(data):
+        return False
+    length, chunk_type = struct.unpack_from('>I4s', data, offset + 8)
+    crc = struct.unpack_from('>I', data, offset + 29)[0]
+    return length == 13 and chunk_type == b'IHDR' and zlib.crc32(data[offset + 12:offset + 29]) == crc
+
+def validate_elf(data, offset):
+    """ELF ident: 32/64-bit class, little/big endian, version 1, and a matching e_version."""
+    if offset + 24 > len(data):
+        return False
+    elf_class, encoding, version = data[offset + 4], data[offset + 5], data[offset + 6]
+    if elf_class not in (1, 2) or encoding not in (1, 2) or version != 1:
+        return False
+    return struct.unpack_from('<I' if encoding == 1 else '>I', data, offset + 20)[0] == 1
+
+def validate_pe(data, offset):
+    """PE: e_lfanew points inside the data at the PE signature."""
+    if offset + 64 > len(data):
+        return False
+    pe_offset = offset + struct.unpack_from('<I', data, offset + 0x3C)[0]
+    return pe_offset + 24 <= len(data) and data[pe_offset:pe_offset + 4] == b'PE\x00\x00'
+
+def validate_tar(data, offset):
+    """TAR: the header containing the ustar magic has a valid checksum."""
+    start = offset - 257
+    if start < 0 or start + 512 > len(data):
+        return False
+    header = data[start:start + 512]
     try:
-        temp_file = f"temp_{offset}.bin"
-        with open(file_path, 'rb') as f:
-            f.seek(offset)
-            data = f.read(1024 * 1024)  # Read up to 1MB for verification
-        with open(temp_file, 'wb') as f:
-            f.write(data)
-        result = subprocess.check_output(['file', temp_file], text=True)
-        os.remove(temp_file)
-        return file_type.lower() in result.lower()
+        checksum = int(header[148:156].split(b'\x00')[0].strip() or b'-1', 8)
+    except ValueError:
+        return False
+    return checksum == sum(header[:148]) + 8 * 32 + sum(header[156:])
+
+def validate_jpeg(data, offset):
+    """JPEG: SOI followed by a sequence of well-formed marker segments up to a frame or scan header."""
+    pos = offset + 2
+    for _ in range(16):
+        if pos + 4 > len(data) or data[pos] != 0xFF:
+            return False
+        marker = data[pos + 1]
+        length = struct.unpack_from('>H', data, pos + 2)[0]
+        if not (marker in (0xDA, 0xDB, 0xDD, 0xFE) or 0xC0 <= marker <= 0xCF or 0xE0 <= marker <= 0xEF) or length < 2:
+            return False
+        if marker == 0xDA or 0xC0 <= marker <= 0xC3:
+            return True
+        pos += 2 + length
+    return True
+
+def validate_gzip(data, offset):
+    """GZIP: deflate method, no reserved flag bits, known extra flags and OS."""
+    if offset + 10 > len(data):
+        return False
+    flags, extra_flags, os_type = data[offset + 3], data[offset + 8], data[offset + 9]
+    return not flags & 0xE0 and extra_flags in (0, 2, 4) and (os_type <= 13 or os_type == 255)
+
+VALIDATORS = {
+    'ZIP': validate_zip,
+    'PNG': validate_png,
+    'ELF': validate_elf,
+    'PE': validate_pe,
+    'TAR': validate_tar,
+    'JPEG': validate_jpeg,
+    'GZIP': validate_gzip,
+}
+
+def verify_file_type(data, offset, file_type):
+    """Verify a signature hit by checking the format's header structure in the mapped data."""
+    validator = VALIDATORS.get(file_type)
+    if validator is None:
+        return True
+    try:
+        return validator(data, offset)
     except Exception as e:
         print(f"[!] Error verifying file type at offset {offset}: {e}")
         return False
 
-def extract_file(file_path, result, output_dir):
-    """Extract embedded file starting at the given offset."""
+# Carve this much when a format's real end cannot be determined
+DEFAULT_CARVE_SIZE = 1024 * 1024
+
+def zip_member_extent(data, offset):
+    """ZIP local file header without its own archive: the header, name, extra field and compressed data."""
+    flags = struct.unpack_from('<H', data, offset + 6)[0]
+    compressed_size, _, name_len, extra_len = struct.unpack_from('<IIHH', data, offset + 18)
+    if flags & 0x08 or compressed_size == 0xFFFFFFFF:
+        # Sizes live in a data descriptor or ZIP64 extra field
+        return None
+    return offset, min(offset + 30 + name_len + extra_len + compressed_size, len(data))
+
+# End-of-central-directory offsets per buffer still in use, so each ZIP hit does not rescan to the end;
+# maps id(buffer) to (buffer, offsets), holding the buffer so its id is not reused until it is released
+zip_directories = {}
+
+def zip_directory_offsets(data):
+    """Sorted offsets of every ZIP end-of-central-directory signature in data, found once per buffer."""
+    entry = zip_directories.get(id(data))
+    if entry is None:
+        offsets = []
+        pos = data.find(b'PK\x05\x06')
+        while pos >= 0:
+            offsets.append(pos)
+            pos = data.find(b'PK\x05\x06', pos + 4)
+        entry = zip_directories[id(data)] = data, offsets
+    return entry[1]
+
+def release_zip_directories(data):
+    """Forget the directory offsets of a buffer that is no longer scanned."""
+    zip_directories.pop(id(data), None)
+
+def zip_archive(data, offset):
+    """The (start, end) of the archive owning the first central directory after offset that starts at or before it."""
+    offsets = zip_directory_offsets(data)
+    for pos in islice(offsets, bisect_left(offsets, offset + 4), None):
+        if pos + 22 > len(data):
+            return None
+        cd_size, cd_offset, comment_len = struct.unpack_from('<IIH', data, pos + 12)
+        start = pos - cd_size - cd_offset
+        if start <= offset:
+            return start, min(pos + 22 + comment_len, len(data))
+        # A complete archive stored inside this one; keep looking for the outer directory
+    return None
+
+def zip_extent(data, offset):
+    """ZIP: the archive whose central directory points back to this offset, else just this entry."""
+    archive = zip_archive(data, offset)
+    if archive and archive[0] == offset:
+        return archive
+    # No directory, or one belonging to an archive enclosing this entry
+    return zip_member_extent(data, offset)
+
+def png_extent(data, offset):
+    """PNG: walk the chunks to the end of IEND."""
+    pos = offset + 8
+    while pos + 12 <= len(data):
+        length, chunk_type = struct.unpack_from('>I4s', data, pos)
+        pos += 12 + length
+        if chunk_type == b'IEND':
+            return offset, min(pos, len(data))
+    return None
+
+def jpeg_extent(data, offset):
+    """JPEG: walk marker segments and entropy-coded scans to the EOI marker."""
+    pos = offset + 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xD9:
+            return offset, pos + 2
+        if marker == 0xFF:
+            pos += 1  # Fill byte
+            continue
+        pos += 2 + struct.unpack_from('>H', data, pos + 2)[0]
+        if marker != 0xDA:
+            continue
+        # Entropy-coded data ends at the first 0xFF not followed by a stuffed zero or a restart marker
+        while True:
+            pos = data.find(b'\xFF', pos)
+            if pos < 0 or pos + 1 >= len(data):
+                return None
+            following = data[pos + 1]
+            if following == 0 or 0xD0 <= following <= 0xD7:
+                pos += 2
+            elif following == 0xFF:
+                pos += 1
+            else:
+                break
+    return None
+
+def gzip_extent(data, offset):
+    """GZIP: run the stream through a decompressor until the deflate stream and trailer end."""
+    decompressor = zlib.decompressobj(wbits=31)
+    pos = offset
+    while not decompressor.eof and pos < len(data):
+        chunk = data[pos:pos + DEFAULT_CARVE_SIZE]
+        pos += len(chunk)
+        # Bound the inflated output per call; it is only produced to find where the input ends
+        decompressor.decompress(chunk, DEFAULT_CARVE_SIZE)
+        while decompressor.unconsumed_tail and not decompressor.eof:
+            decompressor.decompress(decompressor.unconsumed_tail, DEFAULT_CARVE_SIZE)
+    if not decompressor.eof:
+        return None
+    return offset, pos - len(decompressor.unused_data)
+
+def elf_extent(data, offset):
+    """ELF: the furthest byte covered by the program headers, sections, and section header table."""
+    if offset + 64 > len(data):
+        return None
+    endian = '<' if data[offset + 5] == 1 else '>'
+    if data[offset + 4] == 2:
+        phoff, shoff = struct.unpack_from(endian + 'QQ', data, offset + 32)
+        phentsize, phnum, shentsize, shnum = struct.unpack_from(endian + 'HHHH', data, offset + 54)
+        program_format, program_fields = endian + 'IIQQQQ', (2, 5)
+        section_format, section_fields = endian + 'IIQQQQ', (4, 5)
+    else:
+        phoff, shoff = struct.unpack_from(endian + 'II', data, offset + 28)
+        phentsize, phnum, shentsize, shnum = struct.unpack_from(endian + 'HHHH', data, offset + 42)
+        program_format, program_fields = endian + 'IIIIII', (1, 4)
+        section_format, section_fields = endian + 'IIIIII', (4, 5)
+    end = max(phoff + phentsize * phnum, shoff + shentsize * shnum, data[offset + 4] * 32 + 20)
+    for table, entsize, count, fmt, (start_field, size_field) in (
+            (phoff, phentsize, phnum, program_format, program_fields),
+            (shoff, shentsize, shnum, section_format, section_fields)):
+        if entsize < struct.calcsize(fmt) or offset + table + entsize * count > len(data):
+            continue
+        for index in range(count):
+            fields = struct.unpack_from(fmt, data, offset + table + index * entsize)
+            # SHT_NOBITS sections (.bss) occupy no file space
+            if fmt is section_format and fields[1] == 8:
+                continue
+            end = max(end, fields[start_field] + fields[size_field])
+    return offset, min(offset + end, len(data))
+
+def pe_extent(data, offset):
+    """PE: the furthest byte covered by the section table, section raw data, and certificate table."""
+    pe_offset = offset + struct.unpack_from('<I', data, offset + 0x3C)[0]
+    section_count, _, _, _, optional_size = struct.unpack_from('<HIIIH', data, pe_offset + 6)
+    optional = pe_offset + 24
+    table = optional + optional_size
+    end = table + 40 * section_count
+    if end > len(data):
+        return None
+    for index in range(section_count):
+        raw_size, raw_pointer = struct.unpack_from('<II', data, table + index * 40 + 16)
+        if raw_size:
+            end = max(end, offset + raw_pointer + raw_size)
+    # The certificate table (data directory 4) is addressed by file offset and usually follows the sections
+    magic = struct.unpack_from('<H', data, optional)[0]
+    directories = optional + (112 if magic == 0x20B else 96)
+    if directories + 40 <= table:
+        cert_offset, cert_size = struct.unpack_from('<II', data, directories + 32)
+        if cert_size:
+            end = max(end, offset + cert_offset + cert_size)
+    return offset, min(end, len(data))
+
+def tar_extent(data, offset):
+    """TAR: walk the 512-byte member headers to the end-of-archive zero block."""
+    start = pos = offset - 257
+    while pos + 512 <= len(data):
+        header = data[pos:pos + 512]
+        if header.count(0) == 512:
+            # End-of-archive is two zero blocks, followed by zero padding up to the 10 KiB record size
+            record_end = start + (pos + 1024 - start + 10239) // 10240 * 10240
+            pos += 512
+            while pos < min(record_end, len(data)) and data[pos:pos + 512].count(0) == 512:
+                pos += 512
+            return start, min(pos, len(data))
+        if header[257:262] != b'ustar':
+            return start, pos
+        try:
+            size = int(header[124:136].split(b'\x00')[0].strip() or b'0', 8)
+        except ValueError:
+            return start, pos
+        pos += 512 + (size + 511) // 512 * 512
+    return start, min(pos, len(data))
+
+EXTENT_FINDERS = {
+    'ZIP': zip_extent,
+    'PNG': png_extent,
+    'JPEG': jpeg_extent,
+    'GZIP': gzip_extent,
+    'ELF': elf_extent,
+    'PE': pe_extent,
+    'TAR': tar_extent,
+}
+
+def find_extent(data, offset, file_type):
+    """Return the (start, end) byte range of the embedded file, or a fixed-size guess if its end cannot be found."""
+    finder = EXTENT_FINDERS.get(file_type)
+    extent = None
+    if finder is not None:
+        try:
+            extent = finder(data, offset)
+        except (struct.error, IndexError, zlib.error):
+            extent = None
+    return extent or (offset, min(offset + DEFAULT_CARVE_SIZE, len(data)))
+
+def copy_range(src_fd, dst_fd, offset, count):
+    """Copy count bytes starting at offset in src_fd to dst_fd, in the kernel where the platform allows it."""
+    kernel_copies = []
+    if hasattr(os, 'copy_file_range'):
+        kernel_copies.append(lambda size: os.copy_file_range(src_fd, dst_fd, size, offset))
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        kernel_copies.append(lambda size: os.sendfile(dst_fd, src_fd, offset, size))
+    while count > 0:
+        size = min(count, 1 << 30)
+        if kernel_copies:
+            try:
+                copied = kernel_copies[0](size)
+            except OSError:
+                # Unsupported between these file systems; try the next method
+                kernel_copies.pop(0)
+                continue
+        else:
+            copied = os.write(dst_fd, os.pread(src_fd, min(size, DEFAULT_CARVE_SIZE), offset))
+        if copied == 0:
+            break
+        offset += copied
+        count -= copied
+
+def extract_file(f, mm, result, output_dir, name_prefix=''):
+    """Carve the embedded file at the given offset of the open, mapped file, copying exactly its detected extent."""
     try:
-        output_file = os.path.join(output_dir, f"{result['type']}_{result['offset']}{result['extension']}")
-        with open(file_path, 'rb') as f:
-            f.seek(result['offset'])
-            data = f.read(1024 * 1024)  # Extract up to 1MB (simplified)
-            with open(output_file, 'wb') as out:
-                out.write(data)
-        print(f"[*] Extracted {result['type']} to {output_file}")
+        output_file = os.path.join(output_dir, f"{name_prefix}{result['type']}_{result['offset']}{result['extension']}")
+        start, end = find_extent(mm, result['offset'], result['type'])
+        with open(output_file, 'wb') as out:
+            copy_range(f.fileno(), out.fileno(), start, end - start)
+        print(f"[*] Extracted {result['type']} ({end - start} bytes) to {output_file}")
         return output_file
     except Exception as e:
         print(f"[!] Error extracting {result['type']} at offset {result['offset']}: {e}")
         return None
 
-def save_results(results, output_dir, input_file):
-    """Save scan results to a CSV file."""
-    os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, 'binscan_results.csv')
+class BufferFile(io.RawIOBase):
+    """Read-only, seekable file over a byte range of a buffer, so zipfile can read a mapped archive in place."""
+
+    def __init__(self, data, start, end):
+        self.data = data
+        self.start = start
+        self.end = end
+        self.pos = start
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: self.start, io.SEEK_CUR: self.pos, io.SEEK_END: self.end}[whence]
+        self.pos = min(max(base + pos, self.start), self.end)
+        return self.pos - self.start
+
+    def tell(self):
+        return self.pos - self.start
+
+    def readinto(self, buffer):
+        count = min(len(buffer), self.end - self.pos)
+        buffer[:count] = self.data[self.pos:self.pos + count]
+        self.pos += count
+        return count
+
+def inflate_chunks(data, start, end, wbits=31):
+    """Yield the decompressed output of the gzip (or raw deflate) stream in data[start:end], a bounded piece at a time."""
+    decompressor = zlib.decompressobj(wbits=wbits)
+    for pos in range(start, end, DEFAULT_CARVE_SIZE):
+        yield decompressor.decompress(data[pos:min(pos + DEFAULT_CARVE_SIZE, end)], DEFAULT_CARVE_SIZE)
+        while decompressor.unconsumed_tail:
+            yield decompressor.decompress(decompressor.unconsumed_tail, DEFAULT_CARVE_SIZE)
+        if decompressor.eof:
+            return
+    yield decompressor.flush()
+
+def zip_member_payload(data, start, end):
+    """Yield (member name, chunk iterator) for a single ZIP entry read straight from its local header."""
+    flags, method = struct.unpack_from('<HH', data, start + 6)
+    compressed_size, _, name_len, extra_len = struct.unpack_from('<IIHH', data, start + 18)
+    name = bytes(data[start + 30:start + 30 + name_len]).decode('utf-8' if flags & 0x800 else 'cp437')
+    payload = start + 30 + name_len + extra_len
+    if flags & 0x01:
+        raise RuntimeError(f"{name} is encrypted")
+    if method == 8:
+        yield name, inflate_chunks(data, payload, end, wbits=-15)
+    elif method == 0 and not flags & 0x08:
+        yield name, (data[pos:min(pos + DEFAULT_CARVE_SIZE, end)] for pos in range(payload, end, DEFAULT_CARVE_SIZE))
+    else:
+        raise NotImplementedError(f"{name} uses unsupported compression method {method}")
+
+def iter_payloads(data, start, end, file_type):
+    """Yield (member name, chunk iterator) for each payload of the GZIP or ZIP in data[start:end]."""
+    if file_type == 'GZIP':
+        yield '', inflate_chunks(data, start, end)
+        return
     try:
-        with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=['input_file', 'type', 'offset', 'extension'])
-            writer.writeheader()
-            for result in results:
-                writer.writerow({
-                    'input_file': input_file,
-                    'type': result['type'],
-                    'offset': result['offset'],
-                    'extension': result['extension']
-                })
-        print(f"[*] Results saved to {output_file}")
-    except Exception as e:
-        print(f"[!] Error saving results: {e}")
+        archive = zipfile.ZipFile(BufferFile(data, start, end))
+    except zipfile.BadZipFile:
+        # A member whose archive has no central directory here; decompress that one entry
+        yield from zip_member_payload(data, start, end)
+        return
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            with archive.open(info) as member:
+                yield info.filename, iter(lambda: member.read(DEFAULT_CARVE_SIZE), b'')
 
-def generate_summary(results, output_dir):
-    """Generate a summary report."""
-    summary = {}
+def collect_payload(chunks, spill_size, max_size):
+    """Gather decompressed chunks in memory, spilling to an unlinked temporary file past spill_size.
+
+    Returns (buffer, SHA-256 hex digest); the buffer is a bytearray or a read-only mmap of the spill file.
+    """
+    digest = hashlib.sha256()
+    memory = bytearray()
+    spill = None
+    size = 0
+    for chunk in chunks:
+        chunk = chunk[:max_size - size]
+        digest.update(chunk)
+        size += len(chunk)
+        if spill is None and size > spill_size:
+            spill = tempfile.TemporaryFile()
+            spill.write(memory)
+            memory = None
+        if spill is None:
+            memory += chunk
+        else:
+            spill.write(chunk)
+        if size >= max_size:
+            print(f"[!] Payload truncated at {max_size} bytes")
+            break
+    if spill is None:
+        return memory, digest.hexdigest()
+    with spill:
+        spill.flush()
+        # The mapping keeps the unlinked file alive after it is closed
+        return mmap.mmap(spill.fileno(), 0, access=mmap.ACCESS_READ), digest.hexdigest()
+
+CONTAINER_TYPES = ('GZIP', 'ZIP')
+
+def expand_container(data, result, source, depth):
+    """Decompress a GZIP or ZIP hit and rescan each payload, attaching them to the result as children.
+
+    A payload whose SHA-256 was already seen (in any worker) is listed but not rescanned.
+    Returns the end of the container, so hits inside it (like a ZIP's own members) are not expanded again.
+    """
+    start, end = find_extent(data, result['offset'], result['type'])
+    if result['type'] == 'ZIP':
+        archive = zip_archive(data, result['offset'])
+        if archive and archive[0] < result['offset']:
+            # A member of an enclosing archive, which is expanded from its own first entry
+            return end
+    container = f"{source}:{result['type']}@0x{result['offset']:x}"
+    result['children'] = []
+    try:
+        for name, chunks in iter_payloads(data, start, end, result['type']):
+            payload, digest = collect_payload(chunks, worker['spill_size'], worker['max_payload'])
+            path = f"{container}/{name}" if name else container
+            node = {'path': path, 'size': len(payload), 'sha256': digest, 'duplicate_of': None, 'results': []}
+            result['children'].append(node)
+            try:
+                if not payload:
+                    continue
+                # setdefault is atomic in the shared dictionary, so exactly one worker claims each payload
+                first = worker['seen'].setdefault(digest, path)
+                if first != path:
+                    node['duplicate_of'] = first
+                else:
+                    node['results'] = scan_payload(payload, path, depth + 1)
+            finally:
+                release_zip_directories(payload)
+                if isinstance(payload, mmap.mmap):
+                    payload.close()
+    except (zipfile.BadZipFile, zlib.error, EOFError, RuntimeError, NotImplementedError, OSError) as e:
+        # Archive members of an enclosing ZIP, encrypted members and truncated streams end up here
+        if not result['children']:
+            del result['children']
+        print(f"[!] Could not expand {result['type']} at offset 0x{result['offset']:x} in {source}: {e}")
+    return end
+
+def scan_payload(payload, source, depth):
+    """Scan and verify a decompressed payload, expanding nested containers until the depth limit."""
+    verified = []
+    expanded_end = 0
+    for result in scan_range(payload, worker['scanner'], 0, len(payload), worker['chunk_size']):
+        if verify_file_type(payload, result['offset'], result['type']):
+            result['source'] = source
+            verified.append(result)
+            if result['type'] in CONTAINER_TYPES and depth < worker['max_depth'] and result['offset'] >= expanded_end:
+                expanded_end = expand_container(payload, result, source, depth)
+    return verified
+
+def iter_nested(results):
+    """Yield results depth-first, each followed by those found inside its decompressed payloads."""
     for result in results:
-        file_type = result['type']
-        summary[file_type] = summary.get(file_type, 0) + 1
-    
+        yield result
+        for child in result.get('children', ()):
+            yield from iter_nested(child['results'])
+
+def write_tree(tree, results, indent=''):
+    """Write results with the payloads decompressed from each container nested below them.
+
+    Payloads without signatures are counted rather than listed, so large archives stay readable.
+    """
+    for result in results:
+        location = '' if indent else f" in {result['source']}"
+        tree.write(f"{indent}{result['type']} at 0x{result['offset']:x}{location}\n")
+        empty = 0
+        for child in result.get('children', ()):
+            if not child['results'] and not child['duplicate_of']:
+                empty += 1
+                continue
+            note = f", duplicate of {child['duplicate_of']}" if child['duplicate_of'] else ''
+            tree.write(f"{indent}  {child['path']} ({child['size']} bytes, sha256 {child['sha256']}{note})\n")
+            write_tree(tree, child['results'], indent + '    ')
+        if empty:
+            tree.write(f"{indent}  ({empty} payloads without signatures)\n")
+
+def iter_input_files(input_path, output_dir):
+    """Yield (size, path) for the input file, or for every regular file under the input directory."""
+    if os.path.isfile(input_path):
+        yield os.path.getsize(input_path), input_path
+        return
+    skip = os.path.realpath(output_dir)
+    for root, dirs, files in os.walk(input_path):
+        # Never rescan our own results and extracted files
+        dirs[:] = sorted(d for d in dirs if os.path.realpath(os.path.join(root, d)) != skip)
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            try:
+                if os.path.isfile(file_path) and not os.path.islink(file_path):
+                    yield os.path.getsize(file_path), file_path
+            except OSError as e:
+                print(f"[!] Skipping {file_path}: {e}")
+
+def plan_shards(files, shard_size):
+    """Split files into (path, start, end) shards, largest files first so the long tasks start early."""
+    for size, file_path in sorted(files, key=lambda item: item[0], reverse=True):
+        for start in range(0, size, shard_size):
+            yield file_path, start, min(start + shard_size, size)
+
+# Per-process scan settings, set once by init_worker
+worker = {}
+
+def init_worker(signatures, options, seen):
+    """Build the scanner once per worker process; seen maps payload SHA-256 to the first path it appeared at."""
+    worker.update(options)
+    worker['scanner'] = SignatureScanner(signatures)
+    worker['seen'] = seen
+
+def scan_shard(shard):
+    """Scan, verify and optionally carve the matches starting in one shard of a file, and extract its strings.
+
+    The whole file is mapped, so signatures and headers that run past the shard end are still read;
+    only matches that start inside the shard are reported, so neighbouring shards never overlap.
+    Messages are captured and returned so the parent prints them without interleaving.
+    """
+    file_path, start, end = shard
+    verified, rejected, strings = [], [], []
+    messages = io.StringIO()
+    with redirect_stdout(messages):
+        try:
+            with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                try:
+                    expanded_end = 0
+                    for result in scan_range(mm, worker['scanner'], start, end, worker['chunk_size']):
+                        if verify_file_type(mm, result['offset'], result['type']):
+                            result['source'] = file_path
+                            verified.append(result)
+                            if result['type'] in CONTAINER_TYPES and worker['max_depth'] > 0 and result['offset'] >= expanded_end:
+                                expanded_end = expand_container(mm, result, file_path, 0)
+                        else:
+                            rejected.append(result)
+                    if worker['min_length']:
+                        # Same mapping, while the shard is still in the page cache
+                        strings = extract_strings(mm, start, end, worker['min_length'], worker['chunk_size'])
+                    if worker['extract_dir']:
+                        # Name carved files after their source when scanning a directory
+                        name_prefix = ''
+                        if worker['input_root'] != file_path:
+                            name_prefix = os.path.relpath(file_path, worker['input_root']).replace(os.sep, '_') + '_'
+                        # One mapping for every hit, so ZIP directories are located once per shard
+                        for result in verified:
+                            extract_file(f, mm, result, worker['extract_dir'], name_prefix)
+                finally:
+                    release_zip_directories(mm)
+        except (OSError, ValueError) as e:
+            print(f"[!] Error scanning {file_path}: {e}")
+    return file_path, verified, rejected, strings, messages.getvalue()
+
+def run_shards(shards, workers, initargs):
+    """Yield shard results as they finish, from a process pool or in this process for one worker."""
+    if workers == 1:
+        init_worker(*initargs)
+        for shard in shards:
+            yield scan_shard(shard)
+        return
+    pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=initargs)
+    try:
+        # One shard per task keeps the largest-first order and balances uneven files
+        yield from pool.imap_unordered(scan_shard, shards, chunksize=1)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def generate_summary(summary, output_dir, file_count):
+    """Generate a summary report."""
     summary_file = os.path.join(output_dir, 'summary.txt')
     try:
         with open(summary_file, 'w', encoding='utf-8') as f:
@@ -124,57 +808,107 @@ def generate_summary(results, output_dir):
             for file_type, count in summary.items():
                 f.write(f"{file_type}: {count}\n")
             f.write("-" * 50 + "\n")
-            f.write(f"Total signatures found: {len(results)}\n")
+            f.write(f"Files scanned: {file_count}\n")
+            f.write(f"Total signatures found: {sum(summary.values())}\n")
         print(f"[*] Summary report saved to {summary_file}")
     except Exception as e:
         print(f"[!] Error saving summary: {e}")
 
 def main():
     parser = argparse.ArgumentParser(description="BinScan: Analyze and extract embedded files from binaries.")
-    parser.add_argument('-f', '--file', required=True, help="Input binary file to scan.")
+    parser.add_argument('-f', '--file', required=True, help="Input binary file or directory to scan.")
     parser.add_argument('-o', '--output', default='binscan_output', help="Output directory for results and extracted files (default: binscan_output).")
     parser.add_argument('-e', '--extract', action='store_true', help="Extract detected files.")
-    parser.add_argument('-c', '--chunk-size', type=int, default=8192, help="Chunk size for reading files (default: 8192).")
+    parser.add_argument('-c', '--chunk-size', type=int, default=1024 * 1024, help="Block size for scanning the memory-mapped file (default: 1048576).")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help="Worker processes scanning shards in parallel (default: number of CPUs).")
+    parser.add_argument('--shard-size', type=int, default=64 * 1024 * 1024, help="Bytes of a file scanned per task (default: 67108864).")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Decompress GZIP and ZIP hits and rescan their contents.")
+    parser.add_argument('--max-depth', type=int, default=5, help="Container nesting levels to expand with --recursive (default: 5).")
+    parser.add_argument('--spill-size', type=int, default=64 * 1024 * 1024, help="Decompressed payloads larger than this go to a temporary file (default: 67108864).")
+    parser.add_argument('-s', '--strings', action='store_true', help="Also extract printable ASCII and UTF-16LE strings to strings.csv.")
+    parser.add_argument('-n', '--min-length', type=int, default=4, help="Minimum string length in characters for --strings (default: 4).")
+    parser.add_argument('--max-payload', type=int, default=1024 * 1024 * 1024, help="Largest decompressed payload kept per member; larger ones are truncated (default: 1073741824).")
     args = parser.parse_args()
 
     # Validate input
     input_path = Path(args.file)
-    if not input_path.is_file():
+    if not input_path.is_file() and not input_path.is_dir():
         print(f"[!] Input file {args.file} does not exist.")
         sys.exit(1)
+    if args.workers < 1 or args.shard_size < 1 or args.chunk_size < 1:
+        print("[!] --workers, --shard-size and --chunk-size must be positive.")
+        sys.exit(1)
+    if args.max_depth < 1 or args.spill_size < 0 or args.max_payload < 1:
+        print("[!] --max-depth and --max-payload must be positive and --spill-size not negative.")
+        sys.exit(1)
+    if args.min_length < 1:
+        print("[!] --min-length must be positive.")
+        sys.exit(1)
 
     print(f"[*] Starting analysis of {args.file}...")
     signatures = get_signatures()
+    files = list(iter_input_files(args.file, args.output))
+    os.makedirs(args.output, exist_ok=True)
+    options = {
+        'chunk_size': args.chunk_size,
+        'extract_dir': args.output if args.extract else None,
+        'input_root': args.file,
+        'max_depth': args.max_depth if args.recursive else 0,
+        'spill_size': args.spill_size,
+        'max_payload': args.max_payload,
+        'min_length': args.min_length if args.strings else 0,
+    }
+    # Payload hashes are shared between worker processes through a manager
+    manager = multiprocessing.Manager() if args.workers > 1 and args.recursive else None
+    seen = manager.dict() if manager else {}
 
-    # Scan file
-    results = scan_file(args.file, signatures, args.chunk_size)
-    if not results:
-        print("[!] No signatures found.")
-        sys.exit(0)
-
-    # Verify and filter results
-    verified_results = []
-    for result in results:
-        if verify_file_type(args.file, result['offset'], result['type']):
-            verified_results.append(result)
-            print(f"[+] Found {result['type']} at offset 0x{result['offset']:x}")
-        else:
-            print(f"[!] False positive for {result['type']} at offset 0x{result['offset']:x}")
+    # Results stream into the CSV as shards finish, so memory does not grow with the corpus
+    summary = {}
+    output_file = os.path.join(args.output, 'binscan_results.csv')
+    tree_file = os.path.join(args.output, 'nesting_tree.txt')
+    strings_file = os.path.join(args.output, 'strings.csv')
+    string_count = 0
+    try:
+        with open(output_file, 'w', newline='', encoding='utf-8') as f, \
+                open(tree_file, 'w', encoding='utf-8') if args.recursive else io.StringIO() as tree, \
+                open(strings_file, 'w', newline='', encoding='utf-8') if args.strings else io.StringIO() as s:
+            writer = csv.DictWriter(f, fieldnames=['input_file', 'type', 'offset', 'extension'])
+            writer.writeheader()
+            strings_writer = csv.writer(s)
+            strings_writer.writerow(['input_file', 'offset', 'encoding', 'string'])
+            shards = plan_shards(files, args.shard_size)
+            for file_path, verified, rejected, strings, messages in run_shards(shards, args.workers, (signatures, options, seen)):
+                for result in rejected:
+                    print(f"[!] False positive for {result['type']} at offset 0x{result['offset']:x} in {file_path}")
+                # Results found inside decompressed payloads name their nesting path as the input file
+                for result in iter_nested(verified):
+                    print(f"[+] Found {result['type']} at offset 0x{result['offset']:x} in {result['source']}")
+                    writer.writerow({
+                        'input_file': result['source'],
+                        'type': result['type'],
+                        'offset': result['offset'],
+                        'extension': result['extension']
+                    })
+                    summary[result['type']] = summary.get(result['type'], 0) + 1
+                write_tree(tree, [result for result in verified if 'children' in result])
+                strings_writer.writerows((file_path, offset, encoding, text) for offset, encoding, text in strings)
+                string_count += len(strings)
+                print(messages, end='')
+    finally:
+        if manager:
+            manager.shutdown()
+    print(f"[*] Results saved to {output_file}")
+    if args.recursive:
+        print(f"[*] Nesting tree saved to {tree_file}")
+    if args.strings:
+        print(f"[*] {string_count} strings saved to {strings_file}")
 
-    if not verified_results:
+    if not summary:
         print("[!] No verified signatures found.")
         sys.exit(0)
 
-    # Extract files if requested
-    if args.extract:
-        os.makedirs(args.output, exist_ok=True)
-        for result in verified_results:
-            extract_file(args.file, result, args.output)
-
-    # Save results and summary
-    save_results(verified_results, args.output, args.file)
-    generate_summary(verified_results, args.output)
-    print(f"[*] Analysis complete. Total signatures found: {len(verified_results)}")
+    generate_summary(summary, args.output, len(files))
+    print(f"[*] Analysis complete. Total signatures found: {sum(summary.values())}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,94 +1,764 @@
 import argparse
 import re
 import csv
+import gzip
+import hashlib
+import io
+import mmap
+import multiprocessing
 import os
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import zipfile
+import zlib
+from contextlib import ExitStack, redirect_stdout
 from pathlib import Path
 import sys
 from datetime import datetime
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Longest match carried across a block boundary; URLs or emails longer than this are cut short
+MAX_MATCH_LENGTH = 4096
+# Bytes peeked at the start of a file or member to recognise a container; covers the tar magic at 257
+HEAD_SIZE = 512
+# Nested ZIP archives are copied to a temporary file for random access; past this size it goes to disk
+ZIP_SPOOL_SIZE = 64 * 1024 * 1024
+# Fewest digits in a phone number; card numbers have at least 13
+MIN_NUMBER_DIGITS = 10
+
 def get_patterns():
     """Define regex patterns for data extraction."""
     return {
-        'email': re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
-        'url': re.compile(r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+[^\s]*'),
-        'credit_card': re.compile(r'\b(?:\d[ -]*?){13,16}\b'),
-        'phone': re.compile(r'\b(\+\d{1,3}[- ]?)?\(?\d{3}\)?[- ]?\d{3}[- ]?\d{4}\b')
+        'email': re.compile(rb'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+        'url': re.compile(rb'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+[^\s]*'),
+        # One optional separator between digits keeps the match linear on long digit runs
+        'credit_card': re.compile(rb'\b\d(?:[ -]?\d){12,15}\b'),
+        'phone': re.compile(rb'\b(?:\+\d{1,3}[- ]?)?\(?\d{3}\)?[- ]?\d{3}[- ]?\d{4}\b')
     }
 
+# Bytes outside an email's local part, and the run of domain bytes (the pattern's TLD class also allows '|')
+NOT_LOCAL_TABLE = bytes(c not in b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789._%+-'
+                        for c in range(256))
+DOMAIN_RUN = re.compile(rb'[A-Za-z0-9.|-]*')
+# Bytes looked at before an '@' at first; longer local parts widen the search
+LOCAL_LOOKBACK = 64
+
+def local_part_start(data, at, floor):
+    """Return where the run of local-part bytes ending at data[at] starts, no earlier than floor."""
+    lo = max(floor, at - LOCAL_LOOKBACK)
+    while True:
+        edge = data[lo:at].translate(NOT_LOCAL_TABLE).rfind(1)
+        if edge >= 0 or lo == floor:
+            return lo + edge + 1
+        lo = max(floor, lo - LOCAL_LOOKBACK * 16)
+
+# Translation tables marking the bytes of card and phone numbers, and the digits among them
+NUMBER_TABLE = bytes(c in b'0123456789()+-' for c in range(256))
+DIGIT_TABLE = bytes(c in b'0123456789' for c in range(256))
+
+def number_spans(data, start, end):
+    """Yield (start, end) of the spans in data[start:end] that can hold a card or phone number.
+
+    Every such number is a run of digits and ()+- in which single spaces may join two of those bytes,
+    with at least MIN_NUMBER_DIGITS digits. NumPy finds those runs for the whole block at once, so the
+    number patterns only run on the few spans that qualify instead of at every digit.
+    """
+    if np is None:
+        yield start, end
+        return
+    block = data[start:end]
+    marks = np.frombuffer(block.translate(NUMBER_TABLE), dtype=np.bool_)
+    joined = marks.copy()
+    joined[1:-1] |= (np.frombuffer(block, dtype=np.uint8)[1:-1] == 32) & marks[:-2] & marks[2:]
+    # Erode the runs so position i stays True only when joined[i:i + MIN_NUMBER_DIGITS] all are
+    eroded = joined
+    window = 1
+    while window < MIN_NUMBER_DIGITS:
+        step = min(window, MIN_NUMBER_DIGITS - window)
+        eroded = eroded[:-step] & eroded[step:]
+        window += step
+    padded = np.zeros(len(eroded) + 2, dtype=np.bool_)
+    padded[1:-1] = eroded
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    firsts = edges[0::2]
+    lasts = edges[1::2] + MIN_NUMBER_DIGITS - 1
+    if not len(firsts):
+        return
+    # Sum the digits between each run's first and last byte; the sums between runs are skipped
+    bounds = np.column_stack((firsts, lasts)).ravel()
+    if bounds[-1] == len(block):
+        bounds = bounds[:-1]
+    digits = np.frombuffer(block.translate(DIGIT_TABLE), dtype=np.uint8)
+    keep = np.add.reduceat(digits, bounds, dtype=np.int32)[0::2] >= MIN_NUMBER_DIGITS
+    for first, last in zip((firsts[keep] + start).tolist(), (lasts[keep] + start).tolist()):
+        yield first, last
+
+# Luhn doubling of each digit value, applied to every second digit from the right
+LUHN_DOUBLE = [0, 2, 4, 6, 8, 1, 3, 5, 7, 9]
+
+def luhn_valid(value):
+    """Check the Luhn checksum of a card number, ignoring separators."""
+    digits = [c - 48 for c in value if 48 <= c <= 57]
+    total = sum(digits[-1::-2]) + sum(LUHN_DOUBLE[d] for d in digits[-2::-2])
+    return total % 10 == 0
+
 def extract_context(data, start, end, context_size=50):
     """Extract surrounding context for a match."""
     start_context = max(0, start - context_size)
     end_context = min(len(data), end + context_size)
-    return data[start_context:end_context].replace('\n', ' ').strip()
+    return data[start_context:end_context].decode('utf-8', errors='ignore').replace('\n', ' ').strip()
+
+def make_result(data, data_type, start, end, file_path):
+    """Build the result record for a match at data[start:end]."""
+    return {
+        'type': data_type,
+        'value': data[start:end].decode('utf-8', errors='ignore'),
+        'file': file_path,
+        'offset': start,
+        'context': extract_context(data, start, end)
+    }
+
+# Bytes of every position read as one integer; shorter indicators are matched whole, longer ones by this prefix
+PROBE_BYTES = 8
+# Shortest watchlist indicator; shorter lines would match almost everywhere
+MIN_INDICATOR_LENGTH = 3
+# Bump when the layout of saved watchlist indexes changes
+WATCHLIST_INDEX_VERSION = 1
+ASCII_LOWER = bytes.maketrans(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ', b'abcdefghijklmnopqrstuvwxyz')
+
+class Watchlist:
+    """Case-insensitive index of literal indicators, matched in one vectorized pass per block.
 
-def scan_file(file_path, patterns, chunk_size=8192):
-    """Scan a file for patterns and yield matches with metadata."""
+    Every indicator is keyed by its lowercased bytes packed into a 64-bit integer: the whole
+    indicator up to 7 bytes, or its first 8 bytes. The scan reads the 8 bytes at every position as
+    one integer, masks it to each indicator length present, and probes a hashed bit table and then
+    the sorted keys of that length, so the cost per byte does not grow with the list. Only positions
+    whose first 8 bytes match a longer indicator are checked one by one. Case is folded for ASCII.
+    """
+
+    def __init__(self, keys, long_words, digest):
+        # keys maps each probed length to its sorted packed keys; long_words are the indicators of 8+ bytes
+        self.keys = keys
+        self.long_words = long_words
+        self.long_lengths = sorted({len(word) for word in long_words})
+        self.max_length = max(list(keys) + self.long_lengths)
+        self.digest = digest
+        self.multiplier = np.uint64(0x9E3779B97F4A7C15)
+        # About 16 slots per key keeps false candidates rare, and short lists' tables in cache
+        bits = min(max(sum(len(values) for values in keys.values()).bit_length() + 4, 16), 24)
+        self.shift = np.uint64(64 - bits)
+        self.masks = {length: np.uint64((1 << 8 * length) - 1) for length in keys}
+        self.table = np.zeros(1 << bits, dtype=np.uint8)
+        for length, values in keys.items():
+            self.table[(values * self.multiplier) >> self.shift] |= 1 << (length - MIN_INDICATOR_LENGTH)
+
+    def __len__(self):
+        return sum(len(values) for length, values in self.keys.items() if length < PROBE_BYTES) + len(self.long_words)
+
+    @classmethod
+    def build(cls, text, digest):
+        """Index the indicators of a watchlist, one per line; blank lines and lines starting with '#' are skipped."""
+        prefixes = {}
+        long_words = set()
+        ignored = 0
+        for word in {line.strip() for line in text.translate(ASCII_LOWER).splitlines()}:
+            if not word or word.startswith(b'#'):
+                continue
+            if not MIN_INDICATOR_LENGTH <= len(word) <= MAX_MATCH_LENGTH:
+                ignored += 1
+                continue
+            if len(word) >= PROBE_BYTES:
+                long_words.add(word)
+            prefixes.setdefault(min(len(word), PROBE_BYTES), set()).add(word[:PROBE_BYTES])
+        if ignored:
+            print(f"[!] Ignoring {ignored} watchlist entries shorter than {MIN_INDICATOR_LENGTH} or longer than {MAX_MATCH_LENGTH} bytes")
+        if not prefixes:
+            raise ValueError("no indicators found")
+        keys = {length: np.unique(np.frombuffer(b''.join(prefix.ljust(PROBE_BYTES, b'\0') for prefix in group), dtype='<u8'))
+                for length, group in sorted(prefixes.items())}
+        return cls(keys, long_words, digest)
+
+    @classmethod
+    def load(cls, path):
+        """Load the watchlist at path from its saved index, or build the index and save it next to the list.
+
+        The index is saved as path + '.idx' and reused while the list and index layout are unchanged,
+        so large lists are not parsed again on every run.
+        """
+        with open(path, 'rb') as f:
+            text = f.read()
+        digest = hashlib.sha256(repr((WATCHLIST_INDEX_VERSION, MAX_MATCH_LENGTH)).encode() + text).digest()
+        index_path = path + '.idx'
+        try:
+            with np.load(index_path, allow_pickle=False) as saved:
+                if saved['digest'].tobytes() == digest:
+                    keys = {int(name[4:]): saved[name] for name in saved.files if name.startswith('keys')}
+                    blob = saved['long_words'].tobytes()
+                    return cls(keys, set(blob.split(b'\n')) if blob else set(), digest)
+        except (OSError, ValueError, KeyError):
+            pass
+        watchlist = cls.build(text, digest)
+        watchlist.save(index_path)
+        return watchlist
+
+    def save(self, index_path):
+        """Save the index for load; a failure only costs rebuilding it next run."""
+        arrays = {f'keys{length}': values for length, values in self.keys.items()}
+        arrays['long_words'] = np.frombuffer(b'\n'.join(sorted(self.long_words)), dtype=np.uint8)
+        arrays['digest'] = np.frombuffer(self.digest, dtype=np.uint8)
+        try:
+            # Write then rename, so a concurrent run never reads half an index
+            with open(index_path + '.tmp', 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(index_path + '.tmp', index_path)
+        except OSError as e:
+            print(f"[!] Could not save watchlist index {index_path}: {e}")
+
+    def find(self, data, start, end):
+        """Return (offset, length) of every indicator starting in data[start:end], overlapping ones included."""
+        # Lowercase the block and enough lookahead for the longest indicator, padded so 8 bytes can be read anywhere
+        low = data[start:min(end + self.max_length - 1, len(data))].translate(ASCII_LOWER) + bytes(PROBE_BYTES - 1)
+        count = end - start
+        hits = []
+        # Each phase reads the positions phase, phase + 8, ... as aligned 64-bit windows
+        for phase in range(min(PROBE_BYTES, count)):
+            windows = np.frombuffer(low, dtype='<u8', count=(count - phase + PROBE_BYTES - 1) // PROBE_BYTES, offset=phase)
+            for length, keys in self.keys.items():
+                values = windows & self.masks[length] if length < PROBE_BYTES else windows
+                found = np.flatnonzero(self.table[(values * self.multiplier) >> self.shift] & (1 << (length - MIN_INDICATOR_LENGTH)))
+                if not len(found):
+                    continue
+                candidates = values[found]
+                found = found[keys[np.searchsorted(keys, candidates) % len(keys)] == candidates]
+                positions = (found * PROBE_BYTES + phase).tolist()
+                if length < PROBE_BYTES:
+                    hits.extend((pos, length) for pos in positions)
+                    continue
+                for pos in positions:
+                    hits.extend((pos, size) for size in self.long_lengths if low[pos:pos + size] in self.long_words)
+        hits.sort()
+        return [(start + pos, length) for pos, length in hits]
+
+def scan_data(data, patterns, file_path, chunk_size=1024 * 1024, start=0, end=None, watchlist=None, resume=None):
+    """Scan data[start:end] for every pattern in blocks and return matches with byte offsets.
+
+    Each block is searched with MAX_MATCH_LENGTH bytes of the next one visible, so matches starting in
+    it are found whole; each type resumes after its last match, so none is reported twice. Passing
+    the resume dict of the scan that ended at start continues that scan exactly. Every
+    pattern only runs where a cheap pre-filter found a candidate: the "http" prefix for URLs, an '@'
+    for emails, and a long enough digit run for card and phone numbers. With a watchlist, every
+    occurrence of its indicators is reported as well.
+    """
     results = []
-    try:
-        with open(file_path, 'rb') as f:
-            offset = 0
+    size = len(data)
+    end = size if end is None else end
+    if resume is None:
+        resume = dict.fromkeys(patterns, start)
+    for block_start in range(start, end, chunk_size):
+        block_end = min(block_start + chunk_size, end)
+        window_end = min(block_end + MAX_MATCH_LENGTH, size)
+
+        # URLs start with a literal, which the regex engine already finds quickly
+        for match in patterns['url'].finditer(data, max(block_start, resume['url']), window_end):
+            if match.start() >= block_end:
+                break
+            results.append(make_result(data, 'url', match.start(), match.end(), file_path))
+            resume['url'] = match.end()
+
+        # Every email holds exactly one '@'; the block owning the '@' reports the email
+        at = data.find(b'@', block_start, block_end)
+        while at >= 0:
+            if at >= resume['email']:
+                local_start = local_part_start(data, at, max(resume['email'], at - MAX_MATCH_LENGTH))
+                domain_end = DOMAIN_RUN.match(data, at + 1, min(at + MAX_MATCH_LENGTH, size)).end()
+                # One byte past the domain lets the trailing \b see what follows
+                match = patterns['email'].search(data, local_start, min(domain_end + 1, size))
+                if match:
+                    results.append(make_result(data, 'email', match.start(), match.end(), file_path))
+                    resume['email'] = match.end()
+            at = data.find(b'@', at + 1, block_end)
+
+        for span_start, span_end in number_spans(data, block_start, window_end):
+            if span_start >= block_end:
+                break
+            span_end = min(span_end + 1, size)
+            pos = max(span_start, resume['credit_card'])
             while True:
-                chunk = f.read(chunk_size)
-                if not chunk:
+                match = patterns['credit_card'].search(data, pos, span_end)
+                if not match or match.start() >= block_end:
                     break
-                try:
-                    text = chunk.decode('utf-8', errors='ignore')
-                except UnicodeDecodeError:
-                    text = chunk.decode('latin1', errors='ignore')
-                
-                for data_type, pattern in patterns.items():
-                    for match in pattern.finditer(text):
-                        start, end = match.start(), match.end()
-                        context = extract_context(text, start, end)
-                        results.append({
-                            'type': data_type,
-                            'value': match.group(),
-                            'file': file_path,
-                            'offset': offset + start,
-                            'context': context
-                        })
-                offset += len(chunk)
-    except Exception as e:
-        print(f"[!] Error scanning {file_path}: {e}")
+                if luhn_valid(match.group()):
+                    results.append(make_result(data, 'credit_card', match.start(), match.end(), file_path))
+                    pos = resume['credit_card'] = match.end()
+                else:
+                    # A failed checksum does not hide a valid number starting inside the candidate
+                    pos = match.start() + 1
+            for match in patterns['phone'].finditer(data, max(span_start, resume['phone']), span_end):
+                if match.start() >= block_end:
+                    break
+                results.append(make_result(data, 'phone', match.start(), match.end(), file_path))
+                resume['phone'] = match.end()
+
+        if watchlist:
+            for offset, length in watchlist.find(data, block_start, block_end):
+                results.append(make_result(data, 'watchlist', offset, offset + length, file_path))
     return results
 
-def scan_directory(dir_path, patterns):
-    """Recursively scan a directory for files."""
+def line_cut(data, pos):
+    """Move a shard boundary to just past the next newline, which no match can span.
+
+    Both shards sharing a boundary compute the same cut, so each match belongs to exactly one and
+    the shards together match a sequential scan. Data without a later newline is not split at all.
+    """
+    if pos == 0 or pos >= len(data):
+        return min(pos, len(data))
+    return data.find(b'\n', pos) + 1 or len(data)
+
+def iter_input_files(input_path, output_dir, cache_path=None):
+    """Yield (size, path) for the input file, or for every regular file under the input directory."""
+    if os.path.isfile(input_path):
+        yield os.path.getsize(input_path), input_path
+        return
+    skip = os.path.realpath(output_dir)
+    # Nor the cache database and its SQLite journal files
+    skip_files = set()
+    if cache_path:
+        cache_path = os.path.realpath(cache_path)
+        skip_files = {cache_path + suffix for suffix in ('', '-wal', '-shm', '-journal')}
+    skip_names = {os.path.basename(path) for path in skip_files}
+    for root, dirs, files in os.walk(input_path):
+        # Never rescan our own results
+        dirs[:] = sorted(d for d in dirs if os.path.realpath(os.path.join(root, d)) != skip)
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            try:
+                if name in skip_names and os.path.realpath(file_path) in skip_files:
+                    continue
+                if os.path.isfile(file_path) and not os.path.islink(file_path):
+                    yield os.path.getsize(file_path), file_path
+            except OSError as e:
+                print(f"[!] Skipping {file_path}: {e}")
+
+def shard_count(size, shard_size):
+    """Number of shards plan_tasks splits a file of this size into."""
+    return max(1, -(-size // shard_size))
+
+def plan_tasks(files, shard_size, known_digests=None, batch_files=256):
+    """Group files into tasks of (path, start, end, digest) shards, largest files first so the long tasks start early.
+
+    Files larger than shard_size are split into one shard per task; smaller files are batched until a
+    task holds shard_size bytes or batch_files files, so millions of small files do not cost one
+    round trip to a worker each. A file's digest is its cached SHA-256, if any; only whole-file shards
+    carry it, since a worker can only skip the scan when it holds the whole file.
+    """
+    known_digests = known_digests or {}
+    batch, batch_bytes = [], 0
+    for size, file_path in sorted(files, key=lambda item: item[0], reverse=True):
+        if size > shard_size:
+            for start in range(0, size, shard_size):
+                yield [(file_path, start, min(start + shard_size, size), None)]
+            continue
+        batch.append((file_path, 0, size, known_digests.get(file_path)))
+        batch_bytes += size
+        if batch_bytes >= shard_size or len(batch) >= batch_files:
+            yield batch
+            batch, batch_bytes = [], 0
+    if batch:
+        yield batch
+
+# Per-process scan settings, set once by init_worker
+worker = {}
+
+def init_worker(patterns, options):
+    """Keep the compiled patterns and scan settings for every task in this worker process."""
+    worker.update(options)
+    worker['patterns'] = patterns
+
+def container_type(head):
+    """Return 'zip', 'gzip' or 'tar' for data starting with head, or None for anything else."""
+    if head.startswith((b'PK\x03\x04', b'PK\x05\x06')):
+        return 'zip'
+    if head.startswith(b'\x1f\x8b'):
+        return 'gzip'
+    if head[257:262] == b'ustar':
+        return 'tar'
+    return None
+
+def gzip_member_name(name):
+    """Name the file inside a GZIP stream after the stream itself (logs.txt.gz holds logs.txt)."""
+    base = name.rsplit('!', 1)[-1].rsplit('/', 1)[-1]
+    if base.endswith('.tgz'):
+        return base[:-4] + '.tar'
+    return base[:-3] if base.endswith('.gz') else base
+
+def iter_members(stream, kind, name, nested):
+    """Yield (member name, readable stream) for every regular file in a container.
+
+    ZIP needs random access: an archive on disk is read in place, a nested one is first copied, up to
+    max_payload bytes, into a temporary file that stays in memory up to ZIP_SPOOL_SIZE.
+    """
+    if kind == 'gzip':
+        yield gzip_member_name(name), gzip.GzipFile(fileobj=stream)
+    elif kind == 'tar':
+        with tarfile.open(fileobj=stream, mode='r|') as tar:
+            for member in tar:
+                if member.isfile():
+                    yield member.name, tar.extractfile(member)
+    else:
+        with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_SIZE) as spool:
+            if nested:
+                remaining = worker['max_payload']
+                while remaining > 0:
+                    chunk = stream.read(min(worker['chunk_size'], remaining))
+                    if not chunk:
+                        break
+                    spool.write(chunk)
+                    remaining -= len(chunk)
+                spool.seek(0)
+                stream = spool
+            with zipfile.ZipFile(stream) as archive:
+                for info in archive.infolist():
+                    if info.is_dir():
+                        continue
+                    if info.flag_bits & 0x1:
+                        print(f"[!] Skipping encrypted member {name}!{info.filename}")
+                        continue
+                    try:
+                        member = archive.open(info)
+                    except NotImplementedError as e:
+                        # Compression methods zipfile cannot decode, such as deflate64
+                        print(f"[!] Skipping member {name}!{info.filename}: {e}")
+                        continue
+                    with member:
+                        yield info.filename, member
+
+def scan_container(stream, kind, name, depth):
+    """Scan every member of a container in memory and return matches named archive!member.
+
+    Returns None if the container fails before any member is scanned, such as a truncated or carved
+    ZIP without its central directory, so the caller scans its raw bytes instead.
+    """
     results = []
-    for root, _, files in os.walk(dir_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            results.extend(scan_file(file_path, patterns))
+    scanned = 0
+    try:
+        for member_name, member in iter_members(stream, kind, name, depth > 1):
+            results.extend(scan_member(member, f"{name}!{member_name}", depth))
+            scanned += 1
+    except (OSError, EOFError, zlib.error, zipfile.BadZipFile, tarfile.TarError) as e:
+        if not scanned:
+            print(f"[!] Error reading {name}: {e}; scanning its raw bytes instead")
+            return None
+        print(f"[!] Error reading {name}: {e}")
     return results
 
-def save_results(results, output_dir):
-    """Save results to CSV files by data type."""
-    os.makedirs(output_dir, exist_ok=True)
-    by_type = {}
-    
-    for result in results:
-        data_type = result['type']
-        if data_type not in by_type:
-            by_type[data_type] = []
-        by_type[data_type].append(result)
-    
-    for data_type, items in by_type.items():
-        output_file = os.path.join(output_dir, f"{data_type}_results.csv")
-        try:
-            with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=['type', 'value', 'file', 'offset', 'context'])
-                writer.writeheader()
-                writer.writerows(items)
-            print(f"[*] Saved {len(items)} {data_type} results to {output_file}")
-        except Exception as e:
-            print(f"[!] Error saving {data_type} results: {e}")
-
-def generate_summary(results, output_dir):
+def rewind(stream):
+    """Seek a member back to its start for a raw rescan; False if it can only be read forward."""
+    try:
+        if stream.seekable():
+            stream.seek(0)
+            return True
+    except (AttributeError, OSError):
+        # Members of a streamed tar archive cannot seek, and do not even implement seekable()
+        pass
+    return False
+
+def scan_member(member, name, depth):
+    """Expand a member that is itself a container, up to max_depth levels, or scan it as a stream."""
+    kind = container_type(member.peek(HEAD_SIZE)[:HEAD_SIZE])
+    if kind and depth < worker['max_depth']:
+        results = scan_container(member, kind, name, depth + 1)
+        if results is not None:
+            return results
+        if not rewind(member):
+            print(f"[!] Cannot rescan {name} as raw bytes")
+            return []
+    return scan_stream(member, name)
+
+def scan_stream(stream, name):
+    """Scan a decompressed stream in windows and return matches with offsets into the stream.
+
+    Each window keeps MAX_MATCH_LENGTH bytes of lookahead and of lookbehind, and carries the scan's
+    resume state into the next one, so the matches equal those of the whole member held in memory.
+    At most max_payload bytes are read; longer members are truncated.
+    """
+    results = []
+    remaining = worker['max_payload']
+    buffer, base, start = b'', 0, 0
+    resume = dict.fromkeys(worker['patterns'], 0)
+    while True:
+        chunk = stream.read(min(worker['chunk_size'], remaining))
+        remaining -= len(chunk)
+        buffer += chunk
+        done = not chunk or not remaining
+        end = len(buffer) if done else max(start, len(buffer) - MAX_MATCH_LENGTH)
+        for result in scan_data(buffer, worker['patterns'], name, worker['chunk_size'], start, end,
+                                worker['watchlist'], resume):
+            result['offset'] += base
+            results.append(result)
+        if done:
+            break
+        # Keep enough of the scanned tail for email local parts, context and word boundaries
+        keep = max(0, end - MAX_MATCH_LENGTH)
+        buffer = buffer[keep:]
+        base += keep
+        start = end - keep
+        for data_type in resume:
+            resume[data_type] -= keep
+    if not remaining and stream.read(1):
+        print(f"[!] Truncated {name} after {worker['max_payload']} bytes")
+    return results
+
+def scan_shard(shard):
+    """Scan one shard of a memory-mapped file and return its outcome.
+
+    The outcome holds the file, the shard start, the matches and a status: 'scanned', 'failed', or
+    'unchanged' when the file's SHA-256 equals the cached digest and the scan was skipped. With
+    hashing on, the shard at offset 0 also hashes the whole file, and with archives on it expands the
+    file if it is a container.
+    """
+    file_path, start, end, known_digest = shard
+    outcome = {'file': file_path, 'start': start, 'digest': None, 'results': [], 'status': 'scanned'}
+    try:
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                if worker['hash_content']:
+                    outcome['digest'] = hashlib.sha256().digest()
+                return outcome
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if worker['hash_content'] and start == 0:
+                    outcome['digest'] = hashlib.sha256(mm).digest()
+                    if outcome['digest'] == known_digest:
+                        outcome['status'] = 'unchanged'
+                        return outcome
+                kind = container_type(mm[:HEAD_SIZE]) if worker['max_depth'] else None
+                if kind:
+                    # The shard at offset 0 expands the whole container; other shards have nothing to do
+                    if start == 0:
+                        outcome['results'] = scan_container(f, kind, str(file_path), 1)
+                        if outcome['results'] is None:
+                            outcome['results'] = scan_data(mm, worker['patterns'], str(file_path), worker['chunk_size'],
+                                                           watchlist=worker['watchlist'])
+                else:
+                    outcome['results'] = scan_data(mm, worker['patterns'], str(file_path), worker['chunk_size'],
+                                                   line_cut(mm, start), line_cut(mm, end), worker['watchlist'])
+    except Exception as e:
+        print(f"[!] Error scanning {file_path}: {e}")
+        outcome['status'] = 'failed'
+    return outcome
+
+def scan_task(task):
+    """Scan every shard of a task and return their outcomes and captured messages.
+
+    Messages are captured and returned so the parent prints them without interleaving.
+    """
+    messages = io.StringIO()
+    with redirect_stdout(messages):
+        outcomes = [scan_shard(shard) for shard in task]
+    return outcomes, messages.getvalue()
+
+def run_tasks(tasks, workers, initargs):
+    """Yield task results as they finish, from a process pool or in this process for one worker."""
+    if workers == 1:
+        init_worker(*initargs)
+        for task in tasks:
+            yield scan_task(task)
+        return
+    # Hand out at most two tasks per worker beyond those already written, so finished batches
+    # never pile up in memory when writing falls behind
+    slots = threading.Semaphore(workers * 2)
+    stopped = threading.Event()
+
+    def throttled():
+        for task in tasks:
+            slots.acquire()
+            if stopped.is_set():
+                return
+            yield task
+
+    pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=initargs)
+    try:
+        # One task at a time keeps the largest-first order and balances uneven files
+        for result in pool.imap_unordered(scan_task, throttled(), chunksize=1):
+            yield result
+            slots.release()
+        pool.close()
+    except BaseException:
+        # Unblock the task feeder so the pool can shut down
+        stopped.set()
+        slots.release()
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+# Bump when the scanner's matching rules change in a way the patterns themselves do not show
+SCANNER_REVISION = 1
+
+def pattern_version(patterns, settings=None):
+    """Fingerprint the pattern set, scanner revision and scan settings; cached matches from another version are stale."""
+    source = repr((SCANNER_REVISION, MAX_MATCH_LENGTH, settings,
+                   sorted((name, pattern.pattern) for name, pattern in patterns.items())))
+    return hashlib.sha256(source.encode()).hexdigest()[:16]
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 BLOB,
+    version TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS matches (
+    file INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    value TEXT NOT NULL,
+    member TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    context TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS matches_file ON matches (file);
+"""
+
+class ResultCache:
+    """Persistent record of every scanned file and its matches, in SQLite.
+
+    A file is current when its size and modification time equal the stored ones and it was scanned
+    with the same pattern-set version; its matches are then read back instead of rescanning it.
+    While a file's matches are being replaced its version is empty, so a run interrupted halfway
+    through a file rescans it next time.
+    """
+
+    # SQLite's default limit on parameters per statement
+    MAX_PARAMETERS = 999
+
+    def __init__(self, path, version):
+        self.version = version
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(CACHE_SCHEMA)
+
+    def lookup(self, path):
+        """Return (id, size, mtime, sha256, version) of path's entry, or None."""
+        return self.db.execute('SELECT id, size, mtime, sha256, version FROM files WHERE path = ?', (path,)).fetchone()
+
+    def is_current(self, entry, size, mtime):
+        """True if an entry from lookup holds complete matches for a file of this size and modification time."""
+        return entry is not None and entry[1] == size and entry[2] == mtime and entry[4] == self.version
+
+    def matches(self, file_id, file_path):
+        """Yield the cached matches of a file as results naming file_path, plus the archive member if any."""
+        for data_type, value, member, offset, context in self.db.execute(
+                'SELECT type, value, member, offset, context FROM matches WHERE file = ? ORDER BY rowid', (file_id,)):
+            yield {'type': data_type, 'value': value, 'file': file_path + member, 'offset': offset, 'context': context}
+
+    def begin(self, path):
+        """Drop path's cached matches and mark its entry incomplete; return its id."""
+        entry = self.lookup(path)
+        if entry is None:
+            return self.db.execute("INSERT INTO files (path, size, mtime, version) VALUES (?, -1, 0, '')",
+                                   (path,)).lastrowid
+        self.db.execute('DELETE FROM matches WHERE file = ?', (entry[0],))
+        self.db.execute("UPDATE files SET version = '' WHERE id = ?", (entry[0],))
+        return entry[0]
+
+    def add(self, file_id, file_path, results):
+        """Store matches of an entry started with begin; results inside archives keep their !member suffix."""
+        self.db.executemany('INSERT INTO matches (file, type, value, member, offset, context) VALUES (?, ?, ?, ?, ?, ?)',
+                            ((file_id, r['type'], r['value'], r['file'][len(file_path):], r['offset'], r['context'])
+                             for r in results))
+
+    def finish(self, file_id, size, mtime, digest):
+        """Mark an entry complete for a file of this size, modification time and SHA-256."""
+        self.db.execute('UPDATE files SET size = ?, mtime = ?, sha256 = ?, version = ? WHERE id = ?',
+                        (size, mtime, digest, self.version, file_id))
+
+    def touch(self, file_id, size, mtime):
+        """Record a new modification time for an entry whose content is unchanged."""
+        self.db.execute('UPDATE files SET size = ?, mtime = ? WHERE id = ?', (size, mtime, file_id))
+
+    def purge(self, other_versions=False):
+        """Delete entries of files that no longer exist and incomplete entries, then compact the database.
+
+        Entries from other versions are kept unless other_versions is set, since they may belong to
+        scans run with other settings. Return the number of entries deleted.
+        """
+        stale = [file_id for file_id, path, version in self.db.execute('SELECT id, path, version FROM files')
+                 if not version or (other_versions and version != self.version) or not os.path.isfile(path)]
+        for start in range(0, len(stale), self.MAX_PARAMETERS):
+            batch = stale[start:start + self.MAX_PARAMETERS]
+            placeholders = ','.join('?' * len(batch))
+            self.db.execute(f'DELETE FROM matches WHERE file IN ({placeholders})', batch)
+            self.db.execute(f'DELETE FROM files WHERE id IN ({placeholders})', batch)
+        self.db.commit()
+        self.db.execute('VACUUM')
+        return len(stale)
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+RESULT_FIELDS = ['type', 'value', 'file', 'offset', 'context']
+
+class ResultWriters:
+    """One streaming CSV writer per data type, opened when the first match of that type arrives."""
+
+    def __init__(self, output_dir, data_types):
+        self.output_dir = output_dir
+        self.counts = dict.fromkeys(data_types, 0)
+        self.output_files = {}
+        self.writers = {}
+        self.stack = ExitStack()
+
+    def write(self, results):
+        for result in results:
+            data_type = result['type']
+            writer = self.writers.get(data_type)
+            if writer is None:
+                os.makedirs(self.output_dir, exist_ok=True)
+                self.output_files[data_type] = os.path.join(self.output_dir, f"{data_type}_results.csv")
+                f = self.stack.enter_context(open(self.output_files[data_type], 'w', newline='', encoding='utf-8'))
+                writer = self.writers[data_type] = csv.writer(f)
+                writer.writerow(RESULT_FIELDS)
+            writer.writerow([result[field] for field in RESULT_FIELDS])
+            self.counts[data_type] += 1
+
+    def close(self):
+        self.stack.close()
+
+def record_outcome(cache, pending, outcome, writers):
+    """Update the cache with one shard outcome; write cached matches if the content was unchanged."""
+    state = pending[outcome['file']]
+    entry = state['entry']
+    if outcome['status'] == 'failed':
+        # Leave the entry incomplete so the file is scanned again next run
+        state['failed'] = True
+        return
+    if outcome['status'] == 'unchanged':
+        cache.touch(entry[0], state['size'], state['mtime'])
+        writers.write(cache.matches(entry[0], outcome['file']))
+        return
+    if state['id'] is None:
+        state['id'] = cache.begin(state['key'])
+    cache.add(state['id'], str(outcome['file']), outcome['results'])
+    if outcome['start'] == 0:
+        state['digest'] = outcome['digest']
+    state['shards'] -= 1
+    if state['shards'] == 0 and not state['failed']:
+        cache.finish(state['id'], state['size'], state['mtime'], state['digest'])
+
+def generate_summary(summary, output_dir, file_count):
     """Generate a summary report."""
-    summary = {'email': 0, 'url': 0, 'credit_card': 0, 'phone': 0}
-    for result in results:
-        summary[result['type']] += 1
-    
     summary_file = os.path.join(output_dir, 'summary.txt')
     try:
         with open(summary_file, 'w', encoding='utf-8') as f:
@@ -97,41 +767,134 @@ def generate_summary(results, output_dir):
             for data_type, count in summary.items():
                 f.write(f"{data_type.capitalize()}: {count}\n")
             f.write("-" * 50 + "\n")
-            f.write(f"Total items extracted: {len(results)}\n")
+            f.write(f"Files scanned: {file_count}\n")
+            f.write(f"Total items extracted: {sum(summary.values())}\n")
         print(f"[*] Summary report saved to {summary_file}")
     except Exception as e:
         print(f"[!] Error saving summary: {e}")
 
 def main():
     parser = argparse.ArgumentParser(description="DataSift: Extract structured data from unstructured sources.")
-    parser.add_argument('-i', '--input', required=True, help="Input file or directory to scan.")
+    parser.add_argument('-i', '--input', help="Input file or directory to scan.")
     parser.add_argument('-o', '--output', default='datasift_output', help="Output directory for results (default: datasift_output).")
-    parser.add_argument('-c', '--chunk-size', type=int, default=8192, help="Chunk size for reading files (default: 8192).")
+    parser.add_argument('-c', '--chunk-size', type=int, default=1024 * 1024, help="Block size for scanning memory-mapped files (default: 1048576).")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help="Worker processes scanning files in parallel (default: number of CPUs).")
+    parser.add_argument('--shard-size', type=int, default=64 * 1024 * 1024, help="Bytes scanned per task; larger files are split and smaller ones batched (default: 67108864).")
+    parser.add_argument('--cache', help="SQLite cache of prior results; files unchanged since the last run are not rescanned.")
+    parser.add_argument('-a', '--archives', action='store_true', help="Scan inside ZIP (including DOCX and XLSX), GZIP and TAR files in memory.")
+    parser.add_argument('--max-depth', type=int, default=5, help="Container nesting levels to expand with --archives (default: 5).")
+    parser.add_argument('--max-payload', type=int, default=1024 * 1024 * 1024, help="Largest decompressed member scanned; larger ones are truncated (default: 1073741824).")
+    parser.add_argument('--watchlist', help="File of literal indicators, one per line, reported wherever they occur, ignoring case.")
+    parser.add_argument('--purge', action='store_true', help="Remove cache entries of deleted files and interrupted scans, then compact the cache.")
+    parser.add_argument('--purge-versions', action='store_true', help="With --purge, also remove entries scanned with other patterns or other -a, --max-depth, --max-payload or --watchlist settings than this run's.")
     args = parser.parse_args()
 
     # Validate input
-    input_path = Path(args.input)
-    if not input_path.exists():
+    if args.purge and not args.cache:
+        print("[!] --purge requires --cache.")
+        sys.exit(1)
+    if args.purge_versions and not args.purge:
+        print("[!] --purge-versions requires --purge.")
+        sys.exit(1)
+    if not args.input and not args.purge:
+        parser.error("the following arguments are required: -i/--input")
+    input_path = Path(args.input) if args.input else None
+    if input_path and not input_path.exists():
         print(f"[!] Input path {args.input} does not exist.")
         sys.exit(1)
+    if args.workers < 1 or args.shard_size < 1 or args.chunk_size < 1:
+        print("[!] --workers, --shard-size and --chunk-size must be positive.")
+        sys.exit(1)
+    if args.max_depth < 1 or args.max_payload < 1:
+        print("[!] --max-depth and --max-payload must be positive.")
+        sys.exit(1)
 
-    print("[*] Starting data extraction...")
     patterns = get_patterns()
+    watchlist = None
+    if args.watchlist:
+        if np is None:
+            print("[!] --watchlist requires NumPy.")
+            sys.exit(1)
+        try:
+            watchlist = Watchlist.load(args.watchlist)
+        except (OSError, ValueError) as e:
+            print(f"[!] Error loading watchlist {args.watchlist}: {e}")
+            sys.exit(1)
+        print(f"[*] Loaded {len(watchlist)} watchlist indicators from {args.watchlist}")
+    options = {
+        'chunk_size': args.chunk_size,
+        'hash_content': bool(args.cache),
+        'max_depth': args.max_depth if args.archives else 0,
+        'max_payload': args.max_payload,
+        'watchlist': watchlist,
+    }
+    settings = ((args.max_depth, args.max_payload) if args.archives else None,
+                watchlist.digest.hex() if watchlist else None)
+    try:
+        cache = ResultCache(args.cache, pattern_version(patterns, settings)) if args.cache else None
+    except sqlite3.Error as e:
+        print(f"[!] Cache error: {e}")
+        sys.exit(1)
+    if args.purge:
+        print(f"[*] Purged {cache.purge(args.purge_versions)} stale entries from {args.cache}")
+        if not input_path:
+            cache.close()
+            return
 
-    # Scan input
-    if input_path.is_file():
-        results = scan_file(input_path, patterns, args.chunk_size)
-    else:
-        results = scan_directory(input_path, patterns)
+    print("[*] Starting data extraction...")
+    files = list(iter_input_files(args.input, args.output, args.cache))
+
+    # Matches stream into one CSV per type as tasks finish, so memory does not grow with the corpus
+    writers = ResultWriters(args.output, list(patterns) + (['watchlist'] if watchlist else []))
+    try:
+        to_scan = files
+        pending, known_digests = {}, {}
+        if cache:
+            # Unchanged files are answered from the cache; the rest are scanned and recorded
+            to_scan = []
+            for size, file_path in files:
+                key = os.path.abspath(file_path)
+                entry = cache.lookup(key)
+                try:
+                    mtime = os.stat(file_path).st_mtime
+                except OSError as e:
+                    print(f"[!] Skipping {file_path}: {e}")
+                    continue
+                if cache.is_current(entry, size, mtime):
+                    writers.write(cache.matches(entry[0], str(file_path)))
+                    continue
+                if entry and entry[3] and entry[1] == size and entry[4] == cache.version:
+                    # Same size, new timestamp: the worker hashes it and skips the scan if the content is the same
+                    known_digests[file_path] = entry[3]
+                pending[file_path] = {'key': key, 'entry': entry, 'size': size, 'mtime': mtime, 'id': None,
+                                      'digest': None, 'shards': shard_count(size, args.shard_size), 'failed': False}
+                to_scan.append((size, file_path))
+            print(f"[*] {len(files) - len(to_scan)} files unchanged since the last run, {len(to_scan)} to scan")
+        tasks = plan_tasks(to_scan, args.shard_size, known_digests)
+        for outcomes, messages in run_tasks(tasks, args.workers, (patterns, options)):
+            print(messages, end='')
+            for outcome in outcomes:
+                writers.write(outcome['results'])
+                if cache:
+                    record_outcome(cache, pending, outcome, writers)
+            if cache:
+                cache.commit()
+    except sqlite3.Error as e:
+        print(f"[!] Cache error: {e}")
+        sys.exit(1)
+    finally:
+        writers.close()
+        if cache:
+            cache.close()
 
-    if not results:
+    if not writers.output_files:
         print("[!] No data extracted.")
         sys.exit(0)
 
-    # Save results and summary
-    save_results(results, args.output)
-    generate_summary(results, args.output)
-    print(f"[*] Extraction complete. Total items found: {len(results)}")
+    for data_type, output_file in writers.output_files.items():
+        print(f"[*] Saved {writers.counts[data_type]} {data_type} results to {output_file}")
+    generate_summary(writers.counts, args.output, len(files))
+    print(f"[*] Extraction complete. Total items found: {sum(writers.counts.values())}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,71 @@
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from contextlib import redirect_stdout
+
+import datasift
+
+
+def scan_file(path, archives=True):
+    """Scan a whole file the way a single worker would, returning (status, [(type, value, file)])."""
+    datasift.init_worker(datasift.get_patterns(), {
+        'chunk_size': 1024 * 1024,
+        'hash_content': False,
+        'max_depth': 5 if archives else 0,
+        'max_payload': 1024 * 1024 * 1024,
+        'watchlist': None,
+    })
+    with redirect_stdout(io.StringIO()):
+        outcome = datasift.scan_shard((path, 0, os.path.getsize(path), None))
+    return outcome['status'], [(r['type'], r['value'], r['file']) for r in outcome['results']]
+
+
+def zip_bytes(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+class ArchiveTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_truncated_zip_is_scanned_as_raw_bytes(self):
+        data = zip_bytes([('a.txt', b'contact carol@example.com now\n')])
+        # Cut before the central directory, as a carved or partly copied archive would be
+        path = self.write('trunc.zip', data[:data.find(b'PK\x01\x02')])
+        self.assertEqual(scan_file(path), scan_file(path, archives=False))
+        self.assertEqual(scan_file(path)[1], [('email', 'carol@example.com', path)])
+
+    def test_truncated_nested_zip_is_scanned_as_raw_bytes(self):
+        inner = zip_bytes([('a.txt', b'contact carol@example.com now\n')])
+        inner = inner[:inner.find(b'PK\x01\x02')]
+        path = self.write('outer.zip', zip_bytes([('inner.zip', inner), ('ok.txt', b'dave@example.com\n')]))
+        status, results = scan_file(path)
+        self.assertEqual(status, 'scanned')
+        self.assertEqual(results, [('email', 'carol@example.com', path + '!inner.zip'),
+                                   ('email', 'dave@example.com', path + '!ok.txt')])
+
+    def test_unsupported_member_is_skipped(self):
+        data = bytearray(zip_bytes([('a.txt', b'alice@example.com\n'), ('b.txt', b'bob@example.com\n')]))
+        # Mark b.txt as deflate64 (method 9), which zipfile cannot decode
+        local = data.find(b'PK\x03\x04', 4)
+        central = data.find(b'PK\x01\x02', data.find(b'PK\x01\x02') + 4)
+        data[local + 8] = data[central + 10] = 9
+        path = self.write('x.zip', bytes(data))
+        self.assertEqual(scan_file(path), ('scanned', [('email', 'alice@example.com', path + '!a.txt')]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+#!/bin/bash
+
+# Check if Python 3 is installed
+if ! command -v python3 &> /dev/null; then
+    echo "Error: Python 3 is required but not installed."
+    exit 1
+fi
+
+# Create virtual environment
+echo "Creating virtual environment..."
+python3 -m venv venv
+
+# Activate virtual environment
+source venv/bin/activate
+
+# Upgrade pip
+echo "Upgrading pip..."
+pip install --upgrade pip
+
+# Install Python dependencies
+echo "Installing Python dependencies..."
+pip install numpy
+
+# Verify Python version
+echo "Verifying Python version..."
+python --version
+
+# Deactivate virtual environment
+deactivate
+
+echo "Setup complete! To use SimiLink, activate the virtual environment with:"
+echo "source venv/bin/activate"
+echo "Then run: python similink.py --help"
\ No newline at end of file
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+SimiLink: Find near-duplicate files across cases with TLSH-style fuzzy hashes.
+Digests are kept in a persistent SQLite index whose locality-sensitive band keys
+answer "what is similar to X" without comparing against every stored file.
+"""
+
+import argparse
+import csv
+import hashlib
+import math
+import os
+import sqlite3
+import sys
+import zlib
+import numpy as np
+
+# Files shorter than this do not fill enough buckets for a meaningful digest
+MIN_LENGTH = 50
+BUCKETS = 128
+# Body bytes per LSH band; 2 bytes hold the codes of 8 buckets, so the 32-byte body gives 16 bands
+BAND_BYTES = 2
+HEADER_SIZE = 3
+BODY_SIZE = BUCKETS // 4
+DIGEST_PREFIX = 'T1'
+
+# Pearson permutation behind every triplet hash, derived from SHA-256 so it never changes between versions
+PEARSON = np.array(sorted(range(256), key=lambda b: hashlib.sha256(bytes([b])).digest()), dtype=np.uint8)
+
+# Salted byte triplets of the 5-byte sliding window: (salt, newest byte, then two older positions)
+TRIPLETS = ((2, 1, 2), (3, 1, 3), (5, 2, 3), (7, 2, 4), (11, 1, 4), (13, 3, 4))
+
+def pair_table(salt):
+    """Pearson hash of (salt, x, y) for every byte pair, indexed by x << 8 | y."""
+    values = np.arange(256, dtype=np.uint8)
+    first = PEARSON[PEARSON[salt] ^ values]
+    return PEARSON[first[:, None] ^ values[None, :]].ravel()
+
+# Two of each triplet's three lookups collapse into one 64K-entry table, leaving one gather per window
+PAIR_TABLES = {salt: pair_table(salt) for salt, _, _ in TRIPLETS}
+
+def pair_diff(x, y):
+    """Body distance between two bytes of packed 2-bit bucket codes; codes 3 apart count double."""
+    diff = 0
+    for shift in range(0, 8, 2):
+        d = abs((x >> shift & 3) - (y >> shift & 3))
+        diff += 6 if d == 3 else d
+    return diff
+
+# Indexed by x << 8 | y
+BYTE_DIFF = np.array([pair_diff(x, y) for x in range(256) for y in range(256)], dtype=np.int32)
+
+def count_windows(block, counts):
+    """Add the bucket hits of every 5-byte window ending in block[4:] to counts."""
+    data = np.frombuffer(block, dtype=np.uint8)
+    if len(data) < 5:
+        return
+    # window[k] is the byte k positions before the newest byte of each window
+    window = [data[4 - k:len(data) - k] for k in range(5)]
+    newest = window[0].astype(np.uint16) << 8
+    pairs = {}
+    values = []
+    for salt, second, third in TRIPLETS:
+        if second not in pairs:
+            pairs[second] = newest | window[second]
+        # The final Pearson lookup is a permutation, so it is applied to the histogram instead of every value
+        values.append(PAIR_TABLES[salt][pairs[second]] ^ window[third])
+    # Two triplets share one bincount over their combined 16-bit value; the row and column sums are
+    # their separate histograms
+    for high, low in zip(values[0::2], values[1::2]):
+        joint = np.bincount(high.astype(np.uint16) << 8 | low, minlength=65536).reshape(256, 256)
+        counts[PEARSON] += joint.sum(axis=1) + joint.sum(axis=0)
+
+def length_code(length):
+    """Log-scale code of the input length, as used in TLSH headers."""
+    if length <= 656:
+        code = math.floor(math.log(length) / math.log(1.5))
+    elif length <= 3199:
+        code = math.floor(math.log(length) / math.log(1.3) - 8.72777)
+    else:
+        code = math.floor(math.log(length) / math.log(1.1) - 62.5472)
+    return code & 0xFF
+
+def build_digest(counts, length, checksum):
+    """Turn bucket counts into the 35-byte digest, or None when the data is too short or uniform."""
+    buckets = counts[:BUCKETS]
+    if length < MIN_LENGTH or np.count_nonzero(buckets) <= BUCKETS // 2:
+        return None
+    q1, q2, q3 = (int(q) for q in np.sort(buckets)[[BUCKETS // 4 - 1, BUCKETS // 2 - 1, 3 * BUCKETS // 4 - 1]])
+    if q3 == 0:
+        return None
+    # Each bucket becomes a 2-bit code saying which quartile its count falls in
+    codes = (buckets > q1).astype(np.uint8) + (buckets > q2) + (buckets > q3)
+    codes = codes.reshape(BODY_SIZE, 4)
+    body = codes[:, 0] | codes[:, 1] << 2 | codes[:, 2] << 4 | codes[:, 3] << 6
+    ratios = (q1 * 100 // q3 % 16) << 4 | q2 * 100 // q3 % 16
+    return bytes([checksum & 0xFF, length_code(length), ratios]) + body.astype(np.uint8).tobytes()
+
+def hash_stream(stream, block_size=1024 * 1024):
+    """Fuzzy-hash a binary stream in blocks; returns the digest bytes or None."""
+    counts = np.zeros(256, dtype=np.int64)
+    checksum = 0
+    length = 0
+    tail = b''
+    while True:
+        chunk = stream.read(block_size)
+        if not chunk:
+            break
+        checksum = zlib.crc32(chunk, checksum)
+        length += len(chunk)
+        # The last 4 bytes of the previous block complete the windows that cross into this one
+        block = tail + chunk
+        count_windows(block, counts)
+        tail = block[-4:]
+    return build_digest(counts, length, checksum)
+
+def hash_file(path, block_size=1024 * 1024):
+    """Fuzzy-hash a file; returns the digest bytes or None."""
+    with open(path, 'rb') as f:
+        return hash_stream(f, block_size)
+
+def format_digest(digest):
+    """Hex form of a digest."""
+    return DIGEST_PREFIX + digest.hex().upper()
+
+def parse_digest(text):
+    """Digest bytes from their hex form, or None if text is not a digest."""
+    if not text.startswith(DIGEST_PREFIX) or len(text) != len(DIGEST_PREFIX) + 2 * (HEADER_SIZE + BODY_SIZE):
+        return None
+    try:
+        return bytes.fromhex(text[len(DIGEST_PREFIX):])
+    except ValueError:
+        return None
+
+def mod_diff(x, y, modulus):
+    """Distance between x and y on a circle of the given size."""
+    diff = np.abs(x - y)
+    return np.minimum(diff, modulus - diff)
+
+def distances(digest, others):
+    """TLSH-style distances from digest to each row of others (an n x 35 array of digests).
+
+    0 means identical; the length, quartile ratio and checksum headers add penalties to the
+    per-bucket code differences of the body.
+    """
+    target = np.frombuffer(digest, dtype=np.uint8).astype(np.int32)
+    others = others.astype(np.int32)
+    length_diff = mod_diff(target[1], others[:, 1], 256)
+    diff = np.where(length_diff <= 1, length_diff, length_diff * 12)
+    for shift in (4, 0):
+        q_diff = mod_diff(target[2] >> shift & 15, others[:, 2] >> shift & 15, 16)
+        diff += np.where(q_diff <= 1, q_diff, (q_diff - 1) * 12)
+    diff += target[0] != others[:, 0]
+    diff += BYTE_DIFF[target[HEADER_SIZE:] << 8 | others[:, HEADER_SIZE:]].sum(axis=1)
+    return diff
+
+def distance(a, b):
+    """TLSH-style distance between two digests."""
+    return int(distances(a, np.frombuffer(b, dtype=np.uint8)[None, :])[0])
+
+def band_keys(digest):
+    """LSH keys of a digest: each band's body bytes tagged with the band number."""
+    return [band << 16 | int.from_bytes(digest[start:start + BAND_BYTES], 'big')
+            for band, start in enumerate(range(HEADER_SIZE, HEADER_SIZE + BODY_SIZE, BAND_BYTES))]
+
+def probe_keys(digest):
+    """Band keys to look up for a digest: its own, plus each with one bucket code a quartile step away.
+
+    Similar files often differ by one step in a few buckets, so probing the neighbouring band values
+    finds them without storing more keys per file.
+    """
+    keys = []
+    for key in band_keys(digest):
+        keys.append(key)
+        for shift in range(0, 8 * BAND_BYTES, 2):
+            code = key >> shift & 3
+            keys.extend(key ^ (code ^ other) << shift for other in (code - 1, code + 1) if 0 <= other <= 3)
+    return keys
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    digest BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bands (
+    key INTEGER NOT NULL,
+    artifact INTEGER NOT NULL,
+    PRIMARY KEY (key, artifact)
+) WITHOUT ROWID;
+"""
+
+class SimilarityIndex:
+    """Persistent fuzzy-hash index in SQLite.
+
+    Every digest is filed under 16 band keys, each covering the codes of 8 buckets. Similar files
+    share at least one band, or one band up to a single step, with high probability, so a query only
+    compares against the files filed under its probe keys instead of against the whole index.
+    """
+
+    # SQLite's default limit on parameters per statement
+    MAX_PARAMETERS = 999
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def is_current(self, path, size, mtime):
+        """True if path is indexed with this size and modification time."""
+        row = self.db.execute('SELECT size, mtime FROM artifacts WHERE path = ?', (path,)).fetchone()
+        return row is not None and row[0] == size and row[1] == mtime
+
+    def add(self, path, size, mtime, digest):
+        """Insert or replace the digest of path."""
+        row = self.db.execute('SELECT id FROM artifacts WHERE path = ?', (path,)).fetchone()
+        if row:
+            self.db.execute('DELETE FROM bands WHERE key IN (%s) AND artifact = ?' % ','.join('?' * (BODY_SIZE // BAND_BYTES)),
+                            band_keys(self.digest(row[0])) + [row[0]])
+            self.db.execute('UPDATE artifacts SET size = ?, mtime = ?, digest = ? WHERE id = ?', (size, mtime, digest, row[0]))
+            artifact = row[0]
+        else:
+            artifact = self.db.execute('INSERT INTO artifacts (path, size, mtime, digest) VALUES (?, ?, ?, ?)',
+                                       (path, size, mtime, digest)).lastrowid
+        self.db.executemany('INSERT OR IGNORE INTO bands (key, artifact) VALUES (?, ?)',
+                            ((key, artifact) for key in band_keys(digest)))
+
+    def digest(self, artifact):
+        """Stored digest of an artifact id."""
+        return self.db.execute('SELECT digest FROM artifacts WHERE id = ?', (artifact,)).fetchone()[0]
+
+    def similar(self, digest, threshold, min_id=0):
+        """Return (distance, id, path) of indexed files within threshold of digest, closest first.
+
+        Only artifacts filed under one of the digest's probe keys are compared; min_id skips ids at or below it.
+        """
+        keys = probe_keys(digest)
+        candidates = self.db.execute(
+            'SELECT id, digest FROM artifacts WHERE id IN '
+            '(SELECT DISTINCT artifact FROM bands WHERE key IN (%s) AND artifact > ?)' % ','.join('?' * len(keys)),
+            keys + [min_id]).fetchall()
+        if not candidates:
+            return []
+        # Score every candidate at once, then look up paths only for the matches
+        others = np.frombuffer(b''.join(row[1] for row in candidates), dtype=np.uint8).reshape(len(candidates), -1)
+        diffs = distances(digest, others)
+        close = {candidates[i][0]: int(diffs[i]) for i in np.flatnonzero(diffs <= threshold)}
+        matches = []
+        ids = list(close)
+        for start in range(0, len(ids), self.MAX_PARAMETERS):
+            batch = ids[start:start + self.MAX_PARAMETERS]
+            for artifact, path in self.db.execute(
+                    'SELECT id, path FROM artifacts WHERE id IN (%s)' % ','.join('?' * len(batch)), batch):
+                matches.append((close[artifact], artifact, path))
+        matches.sort()
+        return matches
+
+    def artifacts(self):
+        """Yield (id, path, digest) for every indexed file."""
+        return self.db.execute('SELECT id, path, digest FROM artifacts ORDER BY id')
+
+    def count(self):
+        """Number of indexed files."""
+        return self.db.execute('SELECT COUNT(*) FROM artifacts').fetchone()[0]
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+def iter_files(paths):
+    """Yield every regular file named by paths, walking directories recursively."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                if os.path.isfile(file_path) and not os.path.islink(file_path):
+                    yield file_path
+
+def command_hash(args):
+    """Print the digest of each file."""
+    for path in iter_files(args.paths):
+        try:
+            digest = hash_file(path, args.block_size)
+        except OSError as e:
+            print(f"[!] Error hashing {path}: {e}")
+            continue
+        print(f"{format_digest(digest) if digest else 'TNULL'}  {path}")
+
+def command_add(args):
+    """Hash files into the index, skipping those unchanged since they were indexed."""
+    index = SimilarityIndex(args.index)
+    added = unchanged = skipped = 0
+    try:
+        for path in iter_files(args.paths):
+            path = os.path.abspath(path)
+            try:
+                stat = os.stat(path)
+                if index.is_current(path, stat.st_size, stat.st_mtime):
+                    unchanged += 1
+                    continue
+                digest = hash_file(path, args.block_size)
+            except OSError as e:
+                print(f"[!] Error hashing {path}: {e}")
+                continue
+            if digest is None:
+                # Too short or too uniform to fingerprint
+                skipped += 1
+                continue
+            index.add(path, stat.st_size, stat.st_mtime, digest)
+            added += 1
+            if added % 10000 == 0:
+                index.commit()
+                print(f"[*] Indexed {added} files...")
+    finally:
+        index.close()
+    print(f"[*] Added {added} files to {args.index} ({unchanged} unchanged, {skipped} too short or uniform to hash)")
+
+def command_query(args):
+    """Print indexed files similar to each target file or digest."""
+    index = SimilarityIndex(args.index)
+    try:
+        for target in args.targets:
+            digest = parse_digest(target)
+            if digest is None:
+                try:
+                    digest = hash_file(target, args.block_size)
+                except OSError as e:
+                    print(f"[!] Error hashing {target}: {e}")
+                    continue
+                if digest is None:
+                    print(f"[!] {target} is too short or uniform to hash")
+                    continue
+            matches = index.similar(digest, args.threshold)[:args.limit]
+            print(f"[*] {len(matches)} files within distance {args.threshold} of {target}")
+            for diff, _, path in matches:
+                print(f"[+] {diff:4d}  {path}")
+    finally:
+        index.close()
+
+def command_pairs(args):
+    """Write every pair of indexed files within the threshold to a CSV file."""
+    index = SimilarityIndex(args.index)
+    os.makedirs(args.output, exist_ok=True)
+    output_file = os.path.join(args.output, 'similar_pairs.csv')
+    pairs = 0
+    try:
+        with open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['path_a', 'path_b', 'distance'])
+            # A separate connection for the per-file lookups while the outer cursor streams the index
+            lookup = SimilarityIndex(args.index)
+            try:
+                for artifact, path, digest in index.artifacts():
+                    # Each pair is reported once, from its lower id
+                    for diff, _, other in lookup.similar(digest, args.threshold, min_id=artifact):
+                        writer.writerow([path, other, diff])
+                        pairs += 1
+            finally:
+                lookup.close()
+    finally:
+        index.close()
+    print(f"[*] {pairs} similar pairs within distance {args.threshold} saved to {output_file}")
+
+def parse_arguments():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="SimiLink: Index fuzzy hashes of files and find near-duplicates.")
+    parser.add_argument('-b', '--block-size', type=int, default=1024 * 1024, help="Bytes read and hashed per block (default: 1048576).")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    hash_parser = commands.add_parser('hash', help="Print the fuzzy hash of files")
+    hash_parser.add_argument('paths', nargs='+', help="Files or directories to hash.")
+
+    add_parser = commands.add_parser('add', help="Add files to the similarity index")
+    add_parser.add_argument('-d', '--index', default='similink.db', help="Index database (default: similink.db).")
+    add_parser.add_argument('paths', nargs='+', help="Files or directories to index, e.g. BinScan or FirmExtract output.")
+
+    query_parser = commands.add_parser('query', help="Find indexed files similar to a file or digest")
+    query_parser.add_argument('-d', '--index', default='similink.db', help="Index database (default: similink.db).")
+    query_parser.add_argument('-t', '--threshold', type=int, default=50, help="Largest distance reported (default: 50).")
+    query_parser.add_argument('-n', '--limit', type=int, default=20, help="Most matches printed per target (default: 20).")
+    query_parser.add_argument('targets', nargs='+', help="Files to look up, or digests printed by the hash command.")
+
+    pairs_parser = commands.add_parser('pairs', help="Report every similar pair in the index")
+    pairs_parser.add_argument('-d', '--index', default='similink.db', help="Index database (default: similink.db).")
+    pairs_parser.add_argument('-t', '--threshold', type=int, default=50, help="Largest distance reported (default: 50).")
+    pairs_parser.add_argument('-o', '--output', default='similink_output', help="Output directory for similar_pairs.csv (default: similink_output).")
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    if args.block_size < 1:
+        print("[!] --block-size must be positive.")
+        sys.exit(1)
+    if args.command in ('query', 'pairs') and not os.path.isfile(args.index):
+        print(f"[!] Index {args.index} does not exist. Create it with the add command.")
+        sys.exit(1)
+
+    commands = {'hash': command_hash, 'add': command_add, 'query': command_query, 'pairs': command_pairs}
+    try:
+        commands[args.command](args)
+    except sqlite3.Error as e:
+        print(f"[!] Index error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()